@@ -1,54 +1,78 @@
-import re
-import time
-import ttkbootstrap as ttk
-from ttkbootstrap.constants import *
-import threading
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
-import subprocess
 import argparse
+import json
+import logging
 import os
+import queue
 import sys
-from PIL import Image, ImageTk
-import cv2
-import numpy as np
-from pathlib import Path
-
-# Try to import drag-and-drop, fail gracefully
-try:
-    from tkinterdnd2 import DND_FILES, TkinterDnD
-    HAS_DND = True
-except ImportError:
-    HAS_DND = False
-    print("tkinterdnd2 not installed. Drag-and-drop feature won't be available.")
-
-def resource_path(relative_path):
-    """ Get the absolute path to a resource, works for dev and for PyInstaller """
+import threading
+import traceback
+from functools import partial
+
+from converter import (Converter, PRESETS, FANOUT_TARGETS, FFMPEG_PATH, GIF_DITHERS, GIF_PALETTE_MODES,
+                       GIF_QUALITIES, GIF_STATS_MODES, PILLOW_EXTENSIONS, SEGMENT_MODES, WEBM_SPEEDS, probe_summary,
+                       setup_file_logging)
+from hot_folder import STABLE_SECONDS
+from output_conflicts import CONFLICT_POLICIES
+from scheduler import default_worker_count
+from track_rules import CHANNEL_PREFERENCES, TrackRules, track_label
+
+# GUI toolkits are imported by load_gui_toolkits(), so headless runs never load Tk
+tk = ttk = filedialog = messagebox = scrolledtext = None
+DND_FILES = TkinterDnD = None
+HAS_DND = False
+
+# Exit codes of the command line interface
+EXIT_OK = 0
+EXIT_FAILED = 1        # at least one job failed
+EXIT_USAGE = 2         # bad arguments or no usable input files
+EXIT_NO_FFMPEG = 3     # preset needs FFmpeg but it was not found
+EXIT_INTERRUPTED = 130
+
+# Milliseconds between two drains of the GUI update queue
+UI_POLL_MS = 100
+
+# Lines kept in the on-screen log; the log file keeps the full history
+MAX_LOG_LINES = 1000
+
+LOG_LEVELS = {"Debug": logging.DEBUG, "Info": logging.INFO, "Warning": logging.WARNING, "Error": logging.ERROR}
+
+
+def load_gui_toolkits():
+    """Import Tk, ttkbootstrap and (optionally) tkinterdnd2"""
+    global tk, ttk, filedialog, messagebox, scrolledtext, DND_FILES, TkinterDnD, HAS_DND
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, scrolledtext
+    import ttkbootstrap as ttk
+
+    # Try to import drag-and-drop, fail gracefully
     try:
-        base_path = sys._MEIPASS
-    except AttributeError:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
-
-# Paths to FFmpeg binaries (essential for the GIF/MP4 conversions)
-FFMPEG_PATH = resource_path("ffmpeg/bin/ffmpeg.exe")
-FFPROBE_PATH = resource_path("ffmpeg/bin/ffprobe.exe")
+        from tkinterdnd2 import DND_FILES, TkinterDnD
+        HAS_DND = True
+    except ImportError:
+        HAS_DND = False
+        print("tkinterdnd2 not installed. Drag-and-drop feature won't be available.")
 
-class VideoConverterApp:
+class VideoConverterApp(Converter):
     def __init__(self, root):
+        super().__init__()
         self.root = root
         self.root.title("Alchemist - Media Converter")
         self.root.geometry("900x600")
 
         # Initialize state variables
         self.file_list = []
-        self.output_folder = ""
         self.skip_h265_warning = None
-        self.overwrite_all = None
-        self.paused = False
-        self.stopped = False
         self.conversion_thread = None
 
+        # Worker threads never touch Tk directly: they post updates here and the
+        # main loop applies them in batches (see process_ui_queue)
+        self.ui_queue = queue.Queue()
+
+        # Report progress from the shared scheduler every conversion submits its jobs to
+        self.scheduler.on_job_started = self.on_job_started
+        self.scheduler.on_job_progress = self.on_job_progress
+        self.scheduler.on_progress = self.on_batch_progress
+
         # Create main frame
         self.main_frame = tk.Frame(root)
         self.main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -63,16 +87,8 @@ class VideoConverterApp:
 
         # Define conversion commands (GIF/MP4 use FFmpeg, WebP uses internal method)
         self.commands = [
-            ("WebM → MP4", self.convert_webm_to_mp4_command),
-            ("WebP → MP4", self.convert_webp_to_mp4_command),
-            ("WebP → GIF", self.convert_webp_to_gif_command),
-            ("MP4 → WebM", self.convert_mp4_to_webm_command),
-            ("MP4 → GIF", self.convert_mp4_to_gif_command),
-            ("GIF → MP4", self.convert_gif_to_mp4_command),
-            ("MKV → MP4 (PS3)", self.convert_mkv_to_mp4_command),
-            ("Extract Audio", self.extract_audio_command),
-            ("Audio → MP3 320k", self.convert_audio_to_mp3_command),
-            ("Video → XviD AVI", self.convert_to_old_device_command),
+            (preset.label, partial(self.convert_preset_command, key))
+            for key, preset in PRESETS.items()
         ]
 
         # Create conversion buttons
@@ -122,9 +138,90 @@ class VideoConverterApp:
                               font=("Arial", 7), fg="orange")
         info_label.pack(anchor="w", pady=(5,0))
 
+        # Number of files converted at the same time
+        workers_frame = tk.Frame(self.left_frame)
+        workers_frame.grid(row=next_row+5, column=0, columnspan=2, pady=5, padx=2, sticky="ew")
+
+        tk.Label(workers_frame, text="Parallel jobs:", font=("Arial", 9, "bold")).pack(side=tk.LEFT)
+        self.workers_var = tk.IntVar(value=default_worker_count())
+        tk.Spinbox(workers_frame, from_=1, to=max(64, default_worker_count()), width=4,
+                   textvariable=self.workers_var).pack(side=tk.LEFT, padx=5)
+
+        # One palette shared by all GIF frames instead of one per frame
+        self.global_palette_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(self.left_frame, text="Shared GIF palette (faster, smaller)",
+                       variable=self.global_palette_var).grid(row=next_row+6, column=0, columnspan=2, padx=2, sticky="w")
+
+        # MP4 -> GIF through palettegen/paletteuse instead of FFmpeg's default palette
+        self.hq_gif_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(self.left_frame, text="High-quality MP4 → GIF palette",
+                       variable=self.hq_gif_var).grid(row=next_row+7, column=0, columnspan=2, padx=2, sticky="w")
+
+        # Long XviD/PS3 encodes cut into chunks encoded on several cores
+        self.segment_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(self.left_frame, text="Split long videos across cores",
+                       variable=self.segment_var).grid(row=next_row+8, column=0, columnspan=2, padx=2, sticky="w")
+
+        # Files the output folder's journal lists as converted are not done again,
+        # other existing outputs follow one policy for the whole batch
+        existing_frame = tk.Frame(self.left_frame)
+        existing_frame.grid(row=next_row+9, column=0, columnspan=2, padx=2, sticky="ew")
+        self.resume_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(existing_frame, text="Skip files already converted",
+                       variable=self.resume_var).grid(row=0, column=0, columnspan=2, sticky="w")
+        tk.Label(existing_frame, text="If output exists:").grid(row=1, column=0, sticky="w")
+        self.conflict_policy_var = tk.StringVar(value="skip")
+        tk.OptionMenu(existing_frame, self.conflict_policy_var, *CONFLICT_POLICIES).grid(row=1, column=1, sticky="w")
+
+        # VP9 speed tier of WebM outputs, and two-pass encoding for archival copies
+        webm_frame = tk.Frame(self.left_frame)
+        webm_frame.grid(row=next_row+10, column=0, columnspan=2, pady=5, padx=2, sticky="ew")
+
+        tk.Label(webm_frame, text="WebM speed:", font=("Arial", 9, "bold")).pack(side=tk.LEFT)
+        self.webm_speed_var = tk.StringVar(value="good")
+        tk.OptionMenu(webm_frame, self.webm_speed_var, *WEBM_SPEEDS).pack(side=tk.LEFT, padx=5)
+        self.two_pass_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(webm_frame, text="Two-pass", variable=self.two_pass_var).pack(side=tk.LEFT)
+
+        # Rules picking the audio track of multi-track files; only files they
+        # can't settle are shown in the review dialog
+        audio_frame = tk.Frame(self.left_frame)
+        audio_frame.grid(row=next_row+11, column=0, columnspan=2, pady=5, padx=2, sticky="ew")
+        audio_frame.grid_columnconfigure(1, weight=1)
+
+        tk.Label(audio_frame, text="Audio tracks:", font=("Arial", 9, "bold")).grid(row=0, column=0, columnspan=2, sticky="w")
+        tk.Label(audio_frame, text="Languages:").grid(row=1, column=0, sticky="w")
+        self.audio_languages_var = tk.StringVar(value="")
+        tk.Entry(audio_frame, textvariable=self.audio_languages_var, width=12).grid(row=1, column=1, sticky="ew")
+        tk.Label(audio_frame, text="Codecs:").grid(row=2, column=0, sticky="w")
+        self.audio_codecs_var = tk.StringVar(value="")
+        tk.Entry(audio_frame, textvariable=self.audio_codecs_var, width=12).grid(row=2, column=1, sticky="ew")
+        tk.Label(audio_frame, text="Channels:").grid(row=3, column=0, sticky="w")
+        self.audio_channels_var = tk.StringVar(value="any")
+        tk.OptionMenu(audio_frame, self.audio_channels_var, *CHANNEL_PREFERENCES).grid(row=3, column=1, sticky="w")
+        self.same_track_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(audio_frame, text="Same track as the previous file",
+                       variable=self.same_track_var).grid(row=4, column=0, columnspan=2, sticky="w")
+
+        # Hot folder: convert every file dropped into a folder until Stop
+        watch_frame = tk.Frame(self.left_frame)
+        watch_frame.grid(row=next_row+12, column=0, columnspan=2, pady=5, padx=2, sticky="ew")
+        watch_frame.grid_columnconfigure(1, weight=1)
+
+        tk.Label(watch_frame, text="Watch folder:", font=("Arial", 9, "bold")).grid(row=0, column=0, columnspan=2, sticky="w")
+        tk.Label(watch_frame, text="Preset:").grid(row=1, column=0, sticky="w")
+        self.watch_preset_var = tk.StringVar(value=next(iter(PRESETS)))
+        tk.OptionMenu(watch_frame, self.watch_preset_var, *PRESETS).grid(row=1, column=1, sticky="w")
+        tk.Label(watch_frame, text="Stable for (s):").grid(row=2, column=0, sticky="w")
+        self.stable_seconds_var = tk.DoubleVar(value=STABLE_SECONDS)
+        tk.Spinbox(watch_frame, from_=1, to=600, width=4,
+                   textvariable=self.stable_seconds_var).grid(row=2, column=1, sticky="w")
+        tk.Button(watch_frame, text="Watch Folder...", command=self.watch_folder_command).grid(
+            row=3, column=0, columnspan=2, pady=2, sticky="ew")
+
         # Tagline row
         tagline = tk.Label(self.left_frame, text="Manage and transform your media", font=("Arial", 8), fg="gray")
-        tagline.grid(row=next_row+5, column=0, columnspan=2, pady=9)
+        tagline.grid(row=next_row+13, column=0, columnspan=2, pady=9)
 
         # File listbox
         self.listbox = tk.Listbox(self.right_frame, selectmode="extended")
@@ -167,10 +264,23 @@ class VideoConverterApp:
         self.stop_btn = tk.Button(self.control_frame, text="Stop", command=self.stop_conversion, state=tk.DISABLED)
         self.stop_btn.pack(side=tk.LEFT, padx=5)
 
+        # Log level of the on-screen log ("Debug" adds per-file progress lines)
+        self.log_level_var = tk.StringVar(value="Info")
+        tk.OptionMenu(self.control_frame, self.log_level_var, *LOG_LEVELS,
+                      command=self.set_log_level).pack(side=tk.RIGHT, padx=5)
+        tk.Label(self.control_frame, text="Log level:").pack(side=tk.RIGHT)
+
+        # Resources used by the last batch (see job_metrics.py)
+        self.summary_var = tk.StringVar(value="")
+        tk.Label(self.right_frame, textvariable=self.summary_var, justify=tk.LEFT, anchor="w",
+                 font=("Arial", 8), fg="gray").pack(fill=tk.X, padx=5)
+
         # Log text area
         self.log_text = scrolledtext.ScrolledText(self.right_frame, height=12, state='disabled', wrap=tk.WORD)
         self.log_text.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
 
+        self.root.after(UI_POLL_MS, self.process_ui_queue)
+
     def on_drop(self, event):
         """Handle file drop event"""
         if event.data:
@@ -206,14 +316,35 @@ class VideoConverterApp:
         self.add_files(files)
 
     def add_files(self, files):
-        """Add files to the conversion list"""
+        """Add files to the conversion list and start analyzing them in the background"""
         if isinstance(files, str):
             files = [files]
         
         for file in files:
             if file and os.path.isfile(file) and file not in self.file_list:
                 self.file_list.append(file)
-                self.listbox.insert(tk.END, os.path.basename(file))
+                if os.path.splitext(file)[1].lower() in PILLOW_EXTENSIONS:
+                    # Read by Pillow alone: ffprobe has nothing to add (and may not be installed)
+                    self.listbox.insert(tk.END, os.path.basename(file))
+                    continue
+                self.listbox.insert(tk.END, f"{os.path.basename(file)}  (analyzing...)")
+                # By the time a conversion button is pressed the probe cache is warm
+                self.probe_in_background(file, self.on_file_probed)
+
+    def on_file_probed(self, input_path, info):
+        """Probe pool callback: show duration, codecs and track count in the queue"""
+        self.post_ui("call", partial(self.show_file_info, input_path, probe_summary(info)))
+
+    def show_file_info(self, input_path, summary):
+        """Replace a queue entry's text with its analysis summary"""
+        if input_path not in self.file_list:
+            return  # removed while it was being analyzed
+        index = self.file_list.index(input_path)
+        selected = self.listbox.selection_includes(index)
+        self.listbox.delete(index)
+        self.listbox.insert(index, f"{os.path.basename(input_path)}  ({summary})" if summary else os.path.basename(input_path))
+        if selected:
+            self.listbox.select_set(index)
 
     def remove_selected(self):
         """Remove selected files from the list"""
@@ -239,942 +370,236 @@ class VideoConverterApp:
             self.output_folder = folder
             self.output_path_var.set(folder)
 
-    def log_message(self, message):
-        """Add message to log with timestamp"""
-        timestamp = time.strftime("%H:%M:%S")
-        self.log_text.configure(state='normal')
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.log_text.configure(state='disabled')
-        self.root.update_idletasks()
-
-    def toggle_pause(self):
-        """Toggle pause state during conversion"""
-        self.paused = not self.paused
-        self.pause_btn.config(text="Resume" if self.paused else "Pause")
-        self.log_message("Conversion paused" if self.paused else "Conversion resumed")
-
-    def stop_conversion(self):
-        """Stop the conversion process"""
-        self.stopped = True
-        self.log_message("Stopping conversion...")
-        
-    def convert_to_old_device_command(self):
-        """Convert any video to XviD AVI for old CRT/DVD player compatibility"""
-        if not self.validate_prerequisites():
-            return
-        if not self.has_ffmpeg():
-            return
-
-        video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.ts', '.m4v', '.mpg', '.mpeg'}
-
-        # Collect audio selections on the main thread BEFORE starting conversion
-        audio_selections = {}
-        for input_path in self.file_list:
-            file_ext = os.path.splitext(input_path)[1].lower()
-            if file_ext not in video_extensions:
-                continue
-            audio_selections[input_path] = self.ask_audio_track(input_path)
-
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_to_old_device_conversions,
-            args=(audio_selections,),
-            daemon=True
-        )
-        self.conversion_thread.start()
+    def display_log(self, line):
+        """Queue a log line for the on-screen log (safe to call from any thread)"""
+        self.ui_queue.put(("log", line + "\n"))
 
-    def process_to_old_device_conversions(self, audio_selections):
-        """Process all video files for old device compatibility"""
-        self.pause_btn.config(state=tk.NORMAL)
-        self.stop_btn.config(state=tk.NORMAL)
+    def set_log_level(self, name):
+        """Change which messages appear in the on-screen log"""
+        self.log_level = LOG_LEVELS[name]
 
-        total_files = len(self.file_list)
-        successful = 0
-        video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.ts', '.m4v', '.mpg', '.mpeg'}
+    def post_ui(self, kind, value):
+        """Queue a GUI update from any thread: "progress", "status" or "call" (a callable)"""
+        self.ui_queue.put((kind, value))
 
+    def process_ui_queue(self):
+        """Apply all queued GUI updates in one go, keeping only the latest progress/status"""
+        log_lines = []
+        progress = None
+        status = None
+        calls = []
         try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-
-                while self.paused:
-                    time.sleep(0.1)
-                    if self.stopped:
-                        break
-
-                file_ext = os.path.splitext(input_path)[1].lower()
-                if file_ext not in video_extensions:
-                    continue
-
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-                self.root.update_idletasks()  # Force UI update
-
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_file = os.path.join(self.output_folder, base_name + "_vintage.avi")
-
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-
-                audio_index = audio_selections.get(input_path, 0)
-                self.log_message(f"Selected audio track index: {audio_index}")
-
-                # Get audio delay for the selected track
-                audio_delay_ms = self.get_audio_delay(input_path, audio_index)
-
-                # Only apply adelay for POSITIVE delays (audio starts after video)
-                # Negative delays mean audio starts earlier - ignore them for vintage conversion
-                if audio_delay_ms > 0:
-                    delay_seconds = audio_delay_ms / 1000.0
-                    self.log_message(f"Applying audio delay of {delay_seconds:.3f} seconds using adelay")
-                    command = (
-                        f'"{FFMPEG_PATH}" -i "{input_path}" '
-                        f'-map 0:v:0 -map 0:a:{audio_index} -sn '
-                        f'-vf "scale=720:-2:flags=lanczos,fps=24000/1001,setsar=1" '
-                        f'{self.get_xvid_video_settings()} '
-                        f'-af "adelay={audio_delay_ms}|{audio_delay_ms}" '
-                        f'-c:a libmp3lame -b:a 192k -ar 48000 -ac 2 '
-                        f'-shortest '
-                        f'-y "{output_file}"'
-                    )
-                else:
-                    # Negative or zero delay - use normal conversion (no adelay)
-                    if audio_delay_ms < 0:
-                        self.log_message(f"Ignoring negative audio delay of {audio_delay_ms/1000:.3f}s (audio starts before video)")
-                    command = (
-                        f'"{FFMPEG_PATH}" -i "{input_path}" '
-                        f'-map 0:v:0 -map 0:a:{audio_index} -sn '
-                        f'-vf "scale=720:-2:flags=lanczos,fps=24000/1001,setsar=1" '
-                        f'{self.get_xvid_video_settings()} '
-                        f'-c:a libmp3lame -b:a 192k -ar 48000 -ac 2 '
-                        f'-y "{output_file}"'
-                    )
-
-                if self.run_ffmpeg_command(command, input_path):
-                    successful += 1
-                    self.log_message(f"Successfully converted {os.path.basename(input_path)}")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)}")
-
+            while True:
+                kind, value = self.ui_queue.get_nowait()
+                if kind == "log":
+                    log_lines.append(value)
+                elif kind == "progress":
+                    progress = value
+                elif kind == "status":
+                    status = value
+                elif kind == "call":
+                    calls.append(value)
+        except queue.Empty:
+            pass
+
+        if log_lines:
+            self.log_text.configure(state='normal')
+            self.log_text.insert(tk.END, "".join(log_lines[-MAX_LOG_LINES:]))
+            # Drop the oldest lines beyond the limit; they are still in the log file
+            line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+            if line_count > MAX_LOG_LINES:
+                self.log_text.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
+            self.log_text.see(tk.END)
+            self.log_text.configure(state='disabled')
+        if progress is not None:
+            self.progress_var.set(progress)
+        if status is not None:
+            self.status_label.config(text=status)
+        try:
+            for call in calls:
+                call()
         finally:
-            self.pause_btn.config(state=tk.DISABLED)
-            self.stop_btn.config(state=tk.DISABLED)
-            self.progress_var.set(100)
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"Old Device conversion {status.lower()}. {successful}/{total_files} files converted.")
-
-    def get_xvid_video_settings(self):
-        """Return video settings string based on selected quality preset"""
-        quality = self.quality_var.get()
-        
-        if quality == "low":
-            # FAST: No rate-distortion, simpler comparison, lower bitrate
-            settings = (
-                f'-c:v libxvid -vtag XVID '
-                f'-b:v 1500k -maxrate 1700k -bufsize 2000k '
-                f'-bf 0 -g 250 -trellis 0 -threads 0'
-            )
-            self.log_message("Using LOW quality preset (1500k - FAST, USB compatible)")
-        elif quality == "optimal":
-            # BALANCED: Rate-distortion OFF, but keep trellis and good comparison
-            settings = (
-                f'-c:v libxvid -vtag XVID '
-                f'-b:v 2000k -maxrate 2500k -bufsize 3000k '
-                f'-bf 0 -g 250 -trellis 1 -cmp 256 -threads 0'
-            )
-            self.log_message("Using OPTIMAL quality preset (2000k - BALANCED speed/quality)")
-        else:  # high
-            # MAX QUALITY: All optimizations enabled (slower)
-            settings = (
-                f'-c:v libxvid -vtag XVID '
-                f'-b:v 3000k -maxrate 4000k -bufsize 8000k '
-                f'-bf 0 -g 250 -mbd rd -cmp 256 -trellis 1 -threads 0'
-            )
-            self.log_message("Using HIGH quality preset (3000k - SLOW, best quality for DVD)")
-        
-        return settings
+            self.root.after(UI_POLL_MS, self.process_ui_queue)
 
-    def convert_webm_to_mp4_command(self):
-        """Handle WebM to MP4 conversion"""
-        if not self.validate_prerequisites():
-            return
-        if not self.has_ffmpeg():
-            return
-        
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_webm_to_mp4_conversions,
-            daemon=True
-        )
-        self.conversion_thread.start()
+    def toggle_pause(self):
+        """Toggle pause state during conversion"""
+        if self.scheduler.paused:
+            self.scheduler.resume()
+        else:
+            self.scheduler.pause()
+        self.pause_btn.config(text="Resume" if self.scheduler.paused else "Pause")
+        self.log_message("Conversion paused" if self.scheduler.paused else "Conversion resumed")
 
-    def webp_to_mp4(self, input_path, output_path):
-        """Convert WebP to MP4 using PIL and OpenCV (from script 1)"""
-        try:
-            webp = Image.open(input_path)
-            width, height = webp.size
-
-            # Check if it's animated
-            if not getattr(webp, 'is_animated', False):
-                self.log_message(f"{os.path.basename(input_path)} is not animated. Skipping.")
-                return False
-
-            total_duration_ms = 0
-            frame_count = webp.n_frames
-
-            # Calculate total duration and average FPS
-            for i in range(frame_count):
-                webp.seek(i)
-                total_duration_ms += webp.info.get('duration', 100)
-
-            average_fps = frame_count / (total_duration_ms / 1000.0)
-            clamped_fps = max(5, min(60, average_fps))
-            self.log_message(f"Calculated FPS: {average_fps:.2f}, Using: {clamped_fps:.2f}")
-
-            # Create video writer
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, clamped_fps, (width, height))
-
-            # Write each frame
-            try:
-                for frame_index in range(frame_count):
-                    if self.stopped:
-                        break
-                    while self.paused:
-                        time.sleep(0.1)
-                        if self.stopped:
-                            break
-                    
-                    webp.seek(frame_index)
-                    frame_cv = cv2.cvtColor(np.array(webp.convert('RGB')), cv2.COLOR_RGB2BGR)
-                    out.write(frame_cv)
-            finally:
-                out.release()
-
-            self.log_message(f"Successfully wrote {frame_count} frames at {clamped_fps:.2f} FPS.")
-            return True
-            
-        except Exception as e:
-            self.log_message(f"Error converting {os.path.basename(input_path)}: {str(e)}")
-            return False
+    def stop_conversion(self):
+        """Stop the conversion process"""
+        self.scheduler.stop()
+        self.log_message("Stopping conversion...")
 
-    def webp_to_gif(self, input_path, output_path):
-        """Convert animated WebP to animated GIF with perfect transparency handling and high quality"""
+    def get_worker_count(self):
+        """Return the number of parallel jobs selected in the UI"""
         try:
-            with Image.open(input_path) as webp:
-                # Check if it's animated
-                if not getattr(webp, 'is_animated', False):
-                    self.log_message(f"{os.path.basename(input_path)} is not animated. Skipping.")
-                    return False
-
-                frames = []
-                frame_durations = []
-                
-                # First, check if the WebP has any transparency at all
-                has_alpha = False
-                test_frame = webp.convert('RGBA')
-                if test_frame.mode == 'RGBA':
-                    # Check if any pixel has transparency (alpha < 255)
-                    alpha = test_frame.getchannel('A')
-                    if alpha.getextrema()[0] < 255:
-                        has_alpha = True
-                
-                # Process all frames
-                for frame_index in range(webp.n_frames):
-                    if self.stopped:
-                        break
-                    while self.paused:
-                        time.sleep(0.1)
-                        if self.stopped:
-                            break
-
-                    webp.seek(frame_index)
-                    frame = webp.convert('RGBA')
-                    
-                    if has_alpha:
-                        # PROPER transparency handling: composite onto white background
-                        # This preserves semi-transparent pixels by blending them properly
-                        background = Image.new('RGB', frame.size, (255, 255, 255))
-                        
-                        # Split the image into RGB and Alpha components
-                        r, g, b, a = frame.split()
-                        
-                        # Composite the RGB image onto white background using the alpha channel as mask
-                        # This is the CRITICAL FIX: use the alpha channel properly
-                        background.paste(frame, (0, 0), a)  # Use alpha as mask
-                        frame = background
-                    else:
-                        # No transparency, just convert to RGB
-                        frame = frame.convert('RGB')
-                    
-                    # Convert to palette mode with high quality settings
-                    # Use Image.ADAPTIVE for better color preservation
-                    frame = frame.convert('P', palette=Image.ADAPTIVE, colors=256, dither=Image.NONE)
-                    
-                    frames.append(frame)
-                    frame_durations.append(webp.info.get('duration', 100))
-
-                if self.stopped:
-                    return False
-
-                if frames:
-                    # Save as high quality animated GIF
-                    frames[0].save(
-                        output_path,
-                        format='GIF',
-                        save_all=True,
-                        append_images=frames[1:],
-                        duration=frame_durations,
-                        loop=0,
-                        disposal=2,  # Restore to background color between frames
-                        optimize=True
-                    )
-                    
-                    self.log_message(f"Successfully converted {webp.n_frames} frames to high-quality GIF.")
-                    return True
-                return False
-
-        except Exception as e:
-            self.log_message(f"Error converting {os.path.basename(input_path)} to GIF: {str(e)}")
-            return False
-
-    def convert_webp_to_gif_command(self):
-        """Handle WebP to GIF conversion using our internal method"""
-        if not self.validate_prerequisites():
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return default_worker_count()
+
+    def start_conversion(self, target, *args):
+        """Run a batch on a background thread, unless one is already running"""
+        if self.conversion_thread is not None and self.conversion_thread.is_alive():
+            messagebox.showwarning("Warning", "A conversion is already running!")
             return
-
-        self.stopped = False
-        self.paused = False
-        self.conversion_thread = threading.Thread(target=self.process_webp_to_gif_conversions, daemon=True)
-        self.conversion_thread.start()
-
-    def process_webp_to_gif_conversions(self):
-        """Process all WebP files in the list for GIF conversion"""
+        self.scheduler.reset()
+        self.scheduler.max_workers = self.get_worker_count()
         self.pause_btn.config(state=tk.NORMAL)
         self.stop_btn.config(state=tk.NORMAL)
-
-        total_files = len(self.file_list)
-        successful = 0
-
-        try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-
-                while self.paused:
-                    time.sleep(0.1)
-                    if self.stopped:
-                        break
-
-                # Only process WebP files for this command
-                if not input_path.lower().endswith('.webp'):
-                    continue
-
-                # Update progress
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-
-                # Create output path
-                output_file = os.path.join(
-                    self.output_folder,
-                    os.path.splitext(os.path.basename(input_path))[0] + ".gif"
-                )
-
-                # Check if output file exists
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-
-                # Convert file
-                if self.webp_to_gif(input_path, output_file):
-                    successful += 1
-                    self.log_message(f"Successfully converted {os.path.basename(input_path)} to GIF")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)} to GIF")
-
-        finally:
-            self.pause_btn.config(state=tk.DISABLED)
-            self.stop_btn.config(state=tk.DISABLED)
-            self.progress_var.set(100)
-
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"GIF Conversion {status.lower()}. {successful}/{total_files} files converted.")
-
-    def run_ffmpeg_command(self, command, input_path):
-        """Run FFmpeg command with error handling and progress output"""
-        try:
-            self.log_message(f"Executing: {command}")
-            # Use Popen to capture stderr in real-time
-            process = subprocess.Popen(
-                command, 
-                shell=True, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                text=True
-            )
-            
-            # Read stderr for progress info
-            for line in process.stderr:
-                if 'time=' in line:
-                    # Extract time info for progress feedback
-                    import re
-                    time_match = re.search(r'time=(\d+:\d+:\d+\.\d+)', line)
-                    if time_match:
-                        self.log_message(f"Progress: {time_match.group(1)}")
-                # Also check for errors
-                if 'error' in line.lower():
-                    self.log_message(f"FFmpeg: {line.strip()}")
-            
-            process.wait()
-            
-            if process.returncode == 0:
-                return True
-            else:
-                self.log_message(f"FFmpeg error for {os.path.basename(input_path)}: return code {process.returncode}")
-                return False
-                
-        except Exception as e:
-            self.log_message(f"FFmpeg error for {os.path.basename(input_path)}: {str(e)}")
-            return False
-
-    def convert_audio_to_mp3_command(self):
-        """Handle audio to MP3 conversion using FFmpeg"""
-        if not self.validate_prerequisites():
-            return
-        if not self.has_ffmpeg():
-            return
-        
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_audio_to_mp3_conversions,
-            daemon=True
-        )
+        self.conversion_thread = threading.Thread(target=target, args=args, daemon=True)
         self.conversion_thread.start()
 
-    def process_audio_to_mp3_conversions(self):
-        """Process all audio files in the list for MP3 conversion"""
+    def run_jobs(self, jobs, description, verb="converted"):
+        """Submit a batch of jobs to the scheduler and report the outcome"""
         total_files = len(self.file_list)
         successful = 0
-        
-        # Common audio file extensions
-        audio_extensions = {'.mp3', '.wav', '.flac', '.aac', '.m4a', '.ogg', '.wma', '.aiff', '.alac', '.ac3'}
-        
-        try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-                
-                # Get file extension and skip non-audio files
-                file_ext = os.path.splitext(input_path)[1].lower()
-                if file_ext not in audio_extensions:
-                    continue
-                
-                # Skip if already MP3 (optional - you might want to re-encode anyway)
-                if file_ext == '.mp3':
-                    self.log_message(f"Skipping {os.path.basename(input_path)} (already MP3)")
-                    continue
-                
-                # Update progress
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-                
-                # Create output path
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_file = os.path.join(self.output_folder, base_name + ".mp3")
-                
-                # Check if output file exists
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-                
-                # Build and run the MP3 conversion command
-                command = f'"{FFMPEG_PATH}" -y -i "{input_path}" -c:a libmp3lame -b:a 320k -map_metadata 0 -id3v2_version 3 "{output_file}"'
-                
-                if self.run_ffmpeg_command(command, input_path):
-                    successful += 1
-                    self.log_message(f"Successfully converted {os.path.basename(input_path)} to MP3")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)} to MP3")
-        
-        finally:
-            self.progress_var.set(100)
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"Audio to MP3 conversion {status.lower()}. {successful}/{total_files} files converted.")
-
-    def convert_webp_to_mp4_command(self):
-        """Handle WebP to MP4 conversion using our internal method"""
-        if not self.validate_prerequisites():
-            return
-        
-        self.stopped = False
-        self.paused = False
-        self.conversion_thread = threading.Thread(target=self.process_webp_conversions, daemon=True)
-        self.conversion_thread.start()
 
-    def process_webp_conversions(self):
-        """Process all WebP files in the list"""
-        self.pause_btn.config(state=tk.NORMAL)
-        self.stop_btn.config(state=tk.NORMAL)
-        
-        total_files = len(self.file_list)
-        successful = 0
-        
         try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-                
-                while self.paused:
-                    time.sleep(0.1)
-                    if self.stopped:
-                        break
-                
-                if not input_path.lower().endswith('.webp'):
-                    continue
-                
-                # Update progress
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-                
-                # Create output path
-                output_file = os.path.join(
-                    self.output_folder,
-                    os.path.splitext(os.path.basename(input_path))[0] + ".mp4"
-                )
-                
-                # Check if output file exists
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-                
-                # Convert file
-                if self.webp_to_mp4(input_path, output_file):
-                    successful += 1
-                    self.log_message(f"Successfully converted {os.path.basename(input_path)}")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)}")
-        
+            self.log_message(f"{description}: {len(jobs)} job(s) on {self.scheduler.max_workers} worker(s)")
+            successful, failed = self.scheduler.run(jobs)
         finally:
-            self.pause_btn.config(state=tk.DISABLED)
-            self.stop_btn.config(state=tk.DISABLED)
-            self.progress_var.set(100)
-            
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"Conversion {status.lower()}. {successful}/{total_files} files converted.")
-
-    def convert_mp4_to_gif_command(self):
-        if not self.validate_prerequisites() or not self.has_ffmpeg():
+            self.post_ui("call", self.reset_controls)
+            self.post_ui("progress", 100)
+            status = "Stopped" if self.scheduler.stopped else "Completed"
+            self.post_ui("status", f"{status}! Successfully {verb} {successful}/{total_files} files.")
+            self.log_message(f"{description} {status.lower()}. {successful}/{total_files} files {verb}.")
+            summary = self.report_batch(jobs)
+            if summary:
+                self.post_ui("call", partial(self.summary_var.set, summary))
+            self.scheduler.reset()
+            self.probe_cache.flush()
+
+    def reset_controls(self):
+        """Disable Pause/Stop once a batch is over"""
+        self.pause_btn.config(state=tk.DISABLED, text="Pause")
+        self.stop_btn.config(state=tk.DISABLED)
+
+    def on_job_started(self, job):
+        """Scheduler callback: a worker picked up a job"""
+        running = sum(1 for j in self.scheduler.jobs if j.status == "running")
+        finished = sum(1 for j in self.scheduler.jobs if j.status in ("done", "failed"))
+        self.post_ui("status", f"Converting: {job.description} ({running} running, {finished}/{len(self.scheduler.jobs)} done)")
+
+    def on_job_progress(self, job):
+        """Scheduler callback: a running job reported percentage, fps or speed"""
+        details = f"{job.progress * 100:.0f}%"
+        if job.fps is not None:
+            details += f" @ {job.fps:.0f} fps"
+        if job.speed is not None:
+            details += f", {job.speed:.2f}x"
+        self.post_ui("status", f"Converting: {job.description} ({details})")
+
+    def on_batch_progress(self, fraction):
+        """Scheduler callback: overall batch progress changed"""
+        self.post_ui("progress", fraction * 100)
+
+    def convert_preset_command(self, preset_key):
+        """Handle a conversion button: validate, pick audio tracks, start the batch"""
+        preset = PRESETS[preset_key]
+        if not self.validate_prerequisites():
             return
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_ffmpeg_conversions,
-            args=('ffmpeg -i "{input}" -vf "fps=30,scale=480:-1:flags=lanczos" "{output}"', '.mp4', '.gif'),
-            daemon=True
-        ).start()
-
-    def convert_gif_to_mp4_command(self):
-        if not self.validate_prerequisites() or not self.has_ffmpeg():
+        if preset.needs_ffmpeg and not self.has_ffmpeg():
             return
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_ffmpeg_conversions,
-            args=('ffmpeg -i "{input}" -vf "scale=trunc(iw/2)*2:trunc(ih/2)*2" -pix_fmt yuv420p -c:v libx264 -movflags faststart "{output}"', '.gif', '.mp4'),
-            daemon=True
-        )
-        self.conversion_thread.start()
 
-    def convert_mp4_to_webm_command(self):
-        """Convert MP4 to WebM using FFmpeg"""
-        if not self.validate_prerequisites():
+        # Pick audio tracks BEFORE starting conversion: the rules settle most
+        # files, one review dialog covers the rest. Reading the tracks may have
+        # to wait for ffprobe, so it runs off the main thread.
+        if preset.needs_audio_track:
+            self.track_rules = self.get_track_rules()
+            files = [f for f in self.file_list if os.path.splitext(f)[1].lower() in preset.extensions]
+            self.status_label.config(text="Reading audio tracks...")
+            threading.Thread(target=self.read_audio_tracks, args=(preset_key, files), daemon=True).start()
             return
-        if not self.has_ffmpeg():
-            return
-        
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_mp4_to_webm_conversions,
-            daemon=True
-        )
-        self.conversion_thread.start()
-        
-    def process_mp4_to_webm_conversions(self):
-        """Process all MP4 files in the list for WebM conversion"""
-        total_files = len(self.file_list)
-        successful = 0
-        
-        try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-                
-                # Only process MP4 files
-                if not input_path.lower().endswith('.mp4'):
-                    continue
-                
-                # Update progress
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-                
-                # Create output path
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_file = os.path.join(self.output_folder, base_name + ".webm")
-                
-                # Check if output file exists
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-                
-                # Build FFmpeg command for MP4 to WebM conversion
-                # VP9 codec gives better quality but is slower
-                # VP8 is faster but lower quality
-                command = f'"{FFMPEG_PATH}" -i "{input_path}" -c:v libvpx-vp9 -crf 30 -b:v 0 -c:a libopus -b:a 128k -y "{output_file}"'
-                
-                # Alternative using VP8 (faster, lower quality):
-                # command = f'"{FFMPEG_PATH}" -i "{input_path}" -c:v libvpx -crf 10 -b:v 1M -c:a libvorbis -y "{output_file}"'
-                
-                if self.run_ffmpeg_command(command, input_path):
-                    successful += 1
-                    self.log_message(f"Successfully converted {os.path.basename(input_path)} to WebM")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)} to WebM")
-        
-        finally:
-            self.progress_var.set(100)
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"MP4 to WebM conversion {status.lower()}. {successful}/{total_files} files converted.")        
 
-    def convert_mkv_to_mp4_command(self):
-        """Convert any video to MP4 with PS3 compatibility"""
-        if not self.validate_prerequisites():
+        self.apply_options()
+        self.start_conversion(self.process_preset, preset_key, {})
+
+    def read_audio_tracks(self, preset_key, files):
+        """Worker thread: let the track rules pick, then review and start on the main thread"""
+        self.prefetch_probes(files)
+        audio_selections, ambiguous = self.select_audio_tracks(files)
+        self.post_ui("call", partial(self.review_and_start, preset_key, audio_selections, ambiguous))
+
+    def review_and_start(self, preset_key, audio_selections, ambiguous):
+        """Ask about the files the track rules couldn't settle, then start the batch"""
+        self.status_label.config(text="Ready")
+        if ambiguous:
+            choices = self.review_audio_tracks(ambiguous)
+            if choices is None:
+                return
+            self.apply_track_choices(audio_selections, ambiguous, choices)
+
+        self.apply_options()
+        self.start_conversion(self.process_preset, preset_key, audio_selections)
+
+    def apply_options(self):
+        """Copy the option widgets to the converter settings used by the next batch"""
+        self.xvid_quality = self.quality_var.get()
+        self.gif_palette = "global" if self.global_palette_var.get() else "per-frame"
+        self.gif_quality = "high" if self.hq_gif_var.get() else "standard"
+        self.segment_mode = "auto" if self.segment_var.get() else "off"
+        self.resume = self.resume_var.get()
+        self.conflict_policy = self.conflict_policy_var.get()
+        self.webm_speed = self.webm_speed_var.get()
+        self.webm_two_pass = self.two_pass_var.get()
+
+    def process_preset(self, preset_key, audio_selections):
+        """Build the jobs for a preset and run them on the scheduler"""
+        preset = PRESETS[preset_key]
+        jobs = self.build_jobs(preset_key, list(self.file_list), audio_selections)
+        self.run_jobs(jobs, preset.description, preset.verb)
+
+    def get_track_rules(self):
+        """TrackRules from the audio track widgets"""
+        return TrackRules(
+            languages=self.audio_languages_var.get().split(","),
+            codecs=self.audio_codecs_var.get().split(","),
+            channels=self.audio_channels_var.get(),
+            same_as_previous=self.same_track_var.get())
+
+    def watch_folder_command(self):
+        """Handle the Watch Folder button: pick a folder and convert what is dropped into it until Stop"""
+        preset_key = self.watch_preset_var.get()
+        if not self.output_folder:
+            messagebox.showwarning("Warning", "No output folder selected!")
             return
-        if not self.has_ffmpeg():
+        if PRESETS[preset_key].needs_ffmpeg and not self.has_ffmpeg():
             return
-
-        video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.ts', '.m4v', '.mpg', '.mpeg'}
-
-        # Collect audio selections on main thread before starting conversion
-        audio_selections = {}
-        for input_path in self.file_list:
-            file_ext = os.path.splitext(input_path)[1].lower()
-            if file_ext not in video_extensions:
-                continue
-            audio_selections[input_path] = self.ask_audio_track(input_path)
-
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_mkv_to_mp4_ps3_compatible,
-            args=(audio_selections,),
-            daemon=True
-        )
-        self.conversion_thread.start()
-
-    def process_webm_to_mp4_conversions(self):
-        """Process all WebM files in the list for MP4 conversion"""
-        total_files = len(self.file_list)
-        successful = 0
-        
         try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-                
-                # Only process WebM files for this command
-                if not input_path.lower().endswith('.webm'):
-                    continue
-                
-                # Update progress
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-                
-                # Create output path
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_file = os.path.join(self.output_folder, base_name + ".mp4")
-                
-                # Check if output file exists
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-                
-                # Build FFmpeg command for WebM to MP4 conversion
-                command = f'"{FFMPEG_PATH}" -i "{input_path}" -c:v libx264 -preset medium -crf 23 -c:a aac -b:a 128k -movflags +faststart -pix_fmt yuv420p -y "{output_file}"'
-                
-                if self.run_ffmpeg_command(command, input_path):
-                    successful += 1
-                    self.log_message(f"Successfully converted {os.path.basename(input_path)} to MP4")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)} to MP4")
-        
-        finally:
-            self.progress_var.set(100)
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"WebM to MP4 conversion {status.lower()}. {successful}/{total_files} files converted.")
-
-    def process_mkv_to_mp4_ps3_compatible(self, audio_selections):
-        """Process video files for PS3 compatibility"""
-        self.pause_btn.config(state=tk.NORMAL)
-        self.stop_btn.config(state=tk.NORMAL)
-
-        total_files = len(self.file_list)
-        successful = 0
-        video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.ts', '.m4v', '.mpg', '.mpeg'}
-
-        try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-
-                while self.paused:
-                    time.sleep(0.1)
-                    if self.stopped:
-                        break
-
-                file_ext = os.path.splitext(input_path)[1].lower()
-                if file_ext not in video_extensions:
-                    continue
-
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Analyzing: {os.path.basename(input_path)}")
-
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_file = os.path.join(self.output_folder, base_name + "_ps3.mp4")
-
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-
-                audio_index = audio_selections.get(input_path, 0)
-                self.log_message(f"Selected audio track index: {audio_index}")
-
-                # Analyze video stream
-                needs_video_reencode, reason = self.needs_ps3_video_reencode(input_path)
-                self.log_message(f"Video re-encode needed: {needs_video_reencode} ({reason})")
-
-                if needs_video_reencode:
-                    video_args = (
-                        f'-c:v libx264 -preset medium -crf 23 '
-                        f'-profile:v high -level:v 4.1 '
-                        f'-pix_fmt yuv420p -movflags +faststart'
-                    )
-                else:
-                    video_args = '-c:v copy'
-
-                # Audio always re-encoded to AAC for PS3 safety
-                audio_args = f'-c:a aac -b:a 192k -ar 48000 -ac 2'
-
-                command = (
-                    f'"{FFMPEG_PATH}" -i "{input_path}" '
-                    f'-map 0:v:0 -map 0:a:{audio_index} -sn '
-                    f'{video_args} {audio_args} '
-                    f'-y "{output_file}"'
-                )
-
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-                if self.run_ffmpeg_command(command, input_path):
-                    successful += 1
-                    mode = "re-encoded" if needs_video_reencode else "remuxed"
-                    self.log_message(f"Successfully {mode} {os.path.basename(input_path)} for PS3")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)}")
-
-        finally:
-            self.pause_btn.config(state=tk.DISABLED)
-            self.stop_btn.config(state=tk.DISABLED)
-            self.progress_var.set(100)
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"PS3 conversion {status.lower()}. {successful}/{total_files} files converted.")
-
-    def needs_ps3_video_reencode(self, input_path):
-        """Check if video stream needs re-encoding for PS3. Returns (bool, reason)."""
-        try:
-            result = subprocess.run(
-                [FFPROBE_PATH, '-v', 'error', '-select_streams', 'v:0',
-                 '-show_entries', 'stream=codec_name,pix_fmt,profile,level,width,height',
-                 '-of', 'json', input_path],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=30
-            )
-
-            import json
-            data = json.loads(result.stdout)
-            streams = data.get('streams', [])
-            if not streams:
-                return True, "no video stream found"
-
-            s = streams[0]
-            codec = s.get('codec_name', '')
-            pix_fmt = s.get('pix_fmt', '')
-            profile = s.get('profile', '').lower()
-            level = int(s.get('level', 999))
-            width = int(s.get('width', 0))
-            height = int(s.get('height', 0))
-
-            if codec != 'h264':
-                return True, f"codec is {codec}, not h264"
-            if pix_fmt != 'yuv420p':
-                return True, f"pixel format is {pix_fmt}"
-            if 'high' not in profile and 'main' not in profile and 'baseline' not in profile:
-                return True, f"unsupported profile: {profile}"
-            if level > 41:
-                return True, f"level {level} exceeds PS3 max (41)"
-            if width > 1920 or height > 1080:
-                return True, f"resolution {width}x{height} exceeds 1080p"
-
-            return False, "already PS3 compatible"
-
-        except Exception as e:
-            return True, f"analysis error: {e}"
-
-    def extract_audio_command(self):
-        """Extract audio from video files with track selection"""
-        if not self.validate_prerequisites():
+            stable_seconds = max(0.0, float(self.stable_seconds_var.get()))
+        except (tk.TclError, ValueError):
+            stable_seconds = STABLE_SECONDS
+        folder = filedialog.askdirectory(title="Select Folder to Watch")
+        if not folder:
             return
-        if not self.has_ffmpeg():
+        error = self.watch_folders_error([folder])
+        if error:
+            messagebox.showerror("Error", error)
             return
 
-        video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.ts', '.m4v', '.mpg', '.mpeg'}
-
-        # Collect audio selections on main thread before starting
-        audio_selections = {}
-        for input_path in self.file_list:
-            file_ext = os.path.splitext(input_path)[1].lower()
-            if file_ext not in video_extensions:
-                continue
-            audio_selections[input_path] = self.ask_audio_track(input_path)
-
-        self.stopped = False
-        self.conversion_thread = threading.Thread(
-            target=self.process_extract_audio,
-            args=(audio_selections,),
-            daemon=True
-        )
-        self.conversion_thread.start()
-        
-    def process_extract_audio(self, audio_selections):
-        """Extract selected audio track from video files"""
-        self.pause_btn.config(state=tk.NORMAL)
-        self.stop_btn.config(state=tk.NORMAL)
-
-        total_files = len(self.file_list)
-        successful = 0
-        video_extensions = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.ts', '.m4v', '.mpg', '.mpeg'}
+        # Nobody is asked while watching: the rules' best guess decides the audio track
+        self.track_rules = self.get_track_rules()
+        self.apply_options()
+        self.start_conversion(self.process_watch, folder, preset_key, stable_seconds)
 
+    def process_watch(self, folder, preset_key, stable_seconds):
+        """Watch a folder on the scheduler until it is stopped"""
+        summary = None
         try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-
-                while self.paused:
-                    time.sleep(0.1)
-                    if self.stopped:
-                        break
-
-                file_ext = os.path.splitext(input_path)[1].lower()
-                self.log_message(f"Processing: {os.path.basename(input_path)} (ext: {file_ext})")
-                
-                if file_ext not in video_extensions:
-                    self.log_message(f"Skipping: extension {file_ext} not in video_extensions list")
-                    continue
-
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Extracting: {os.path.basename(input_path)}")
-
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                
-                audio_index = audio_selections.get(input_path, 0)
-                self.log_message(f"Audio index selected: {audio_index}")
-                
-                ext = self.get_audio_extension(input_path, audio_index)
-                self.log_message(f"Detected audio extension: {ext}")
-                
-                output_file = os.path.join(self.output_folder, base_name + ext)
-                self.log_message(f"Output file will be: {output_file}")
-
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        self.log_message(f"Skipped (user declined overwrite): {output_file}")
-                        continue
-
-                command = (
-                    f'"{FFMPEG_PATH}" -i "{input_path}" '
-                    f'-map 0:a:{audio_index} '
-                    f'-vn -acodec copy '
-                    f'-y "{output_file}"'
-                )
-                self.log_message(f"Running command: {command}")
-
-                if self.run_ffmpeg_command(command, input_path):
-                    successful += 1
-                    self.log_message(f"Successfully extracted audio from {os.path.basename(input_path)}")
-                else:
-                    self.log_message(f"FAILED to extract audio from {os.path.basename(input_path)}")
-
+            self.post_ui("status", f"Watching {folder}...")
+            summary = self.watch_folders([folder], preset_key, stable_seconds=stable_seconds)
         finally:
-            self.pause_btn.config(state=tk.DISABLED)
-            self.stop_btn.config(state=tk.DISABLED)
-            self.progress_var.set(100)
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully extracted {successful}/{total_files} files.")
-            self.log_message(f"Audio extraction {status.lower()}. {successful}/{total_files} files extracted.")
-
-    def process_ffmpeg_conversions(self, command_template, input_ext, output_ext):
-        """Process files using FFmpeg"""
-        total_files = len(self.file_list)
-        successful = 0
-        
-        try:
-            for i, input_path in enumerate(self.file_list):
-                if self.stopped:
-                    break
-                
-                # Skip files that don't match the input extension
-                if input_ext and not input_path.lower().endswith(input_ext):
-                    continue
-                
-                # Update progress
-                progress = (i / total_files) * 100
-                self.progress_var.set(progress)
-                self.status_label.config(text=f"Converting: {os.path.basename(input_path)}")
-                
-                # Create output path
-                base_name = os.path.splitext(os.path.basename(input_path))[0]
-                output_file = os.path.join(self.output_folder, base_name + output_ext)
-                
-                # Check if output file exists
-                if os.path.exists(output_file):
-                    if not self.ask_overwrite(os.path.basename(output_file)):
-                        continue
-                
-                # Build and run command
-                command = command_template.format(input=input_path, output=output_file)
-                command = command.replace("ffmpeg", f'"{FFMPEG_PATH}"', 1)
-                
-                if self.run_ffmpeg_command(command, input_path):
-                    successful += 1
-                    self.log_message(f"Successfully converted {os.path.basename(input_path)}")
-                else:
-                    self.log_message(f"Failed to convert {os.path.basename(input_path)}")
-        
-        finally:
-            self.progress_var.set(100)
-            status = "Stopped" if self.stopped else "Completed"
-            self.status_label.config(text=f"{status}! Successfully converted {successful}/{total_files} files.")
-            self.log_message(f"Conversion {status.lower()}. {successful}/{total_files} files converted.")
+            self.post_ui("call", self.reset_controls)
+            self.post_ui("status", "Stopped watching")
+            if summary:
+                self.post_ui("call", partial(self.summary_var.set, summary))
+            self.scheduler.reset()
+            self.probe_cache.flush()
 
     def validate_prerequisites(self):
         """Check if we have files and output folder selected"""
@@ -1195,185 +620,331 @@ class VideoConverterApp:
             return False
         return True
 
-    def ask_overwrite(self, filename):
-        """Ask user if they want to overwrite an existing file"""
-        result = messagebox.askyesno(
-            "File Exists", 
-            f"The file '{filename}' already exists. Do you want to overwrite it?"
-        )
-        return result
+    def review_audio_tracks(self, ambiguous):
+        """One dialog listing the files the track rules couldn't settle.
 
-    def ask_audio_track(self, input_path):
-        """Show a dialog to select audio track. Returns track index or 0 if only one/cancelled."""
+        Returns {file: track index}, or None if the batch was cancelled.
+        """
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Review Audio Tracks")
+        dialog.geometry("640x400")
+        dialog.grab_set()
+        dialog.focus_force()
+
+        tk.Label(dialog, text="Choose the audio track of these files (the suggested track is preselected):",
+                 wraplength=600, justify='left').pack(pady=(15, 5), padx=15, anchor="w")
+
+        # Scrollable list of files, one track menu each
+        body = tk.Frame(dialog)
+        body.pack(fill=tk.BOTH, expand=True, padx=15, pady=5)
+        canvas = tk.Canvas(body, highlightthickness=0)
+        scrollbar = tk.Scrollbar(body, orient=tk.VERTICAL, command=canvas.yview)
+        rows = tk.Frame(canvas)
+        rows.bind("<Configure>", lambda event: canvas.configure(scrollregion=canvas.bbox("all")))
+        canvas.create_window((0, 0), window=rows, anchor="nw")
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        menus = {}
+        for row, (input_path, entry) in enumerate(ambiguous.items()):
+            name = os.path.basename(input_path)
+            if entry['followers']:
+                name += f" (+{len(entry['followers'])} with the same tracks)"
+            tk.Label(rows, text=name, anchor="w").grid(row=row, column=0, sticky="w", padx=(0, 10), pady=2)
+            labels = [track_label(i, stream) for i, stream in enumerate(entry['streams'])]
+            menu = ttk.Combobox(rows, values=labels, state="readonly", width=40)
+            menu.current(entry['guess'])
+            menu.grid(row=row, column=1, sticky="ew", pady=2)
+            menus[input_path] = menu
+
+        result = {}
+
+        def confirm():
+            result['choices'] = {path: max(0, menu.current()) for path, menu in menus.items()}
+            dialog.destroy()
+
+        buttons = tk.Frame(dialog)
+        buttons.pack(pady=10)
+        tk.Button(buttons, text="Start Conversion", command=confirm, width=20).pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="Cancel", command=dialog.destroy, width=10).pack(side=tk.LEFT, padx=5)
+
+        dialog.wait_window()  # Blocks until dialog is closed, safe on main thread
+        return result.get('choices')
+
+
+class JsonProgressReporter:
+    """Print scheduler events as JSON lines on stdout for scripts to consume"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._lock = threading.Lock()
+        self._last_progress = -1
+        scheduler.on_job_started = self.on_job_started
+        scheduler.on_job_finished = self.on_job_finished
+        scheduler.on_job_progress = self.on_job_progress
+        scheduler.on_progress = self.on_progress
+
+    def emit(self, event, **fields):
+        with self._lock:
+            print(json.dumps({"event": event, **fields}), flush=True)
+
+    def on_job_started(self, job):
+        self.emit("job_started", input=job.input_path, output=job.output_path)
+
+    def on_job_finished(self, job):
+        self.emit("job_finished", input=job.input_path, output=job.output_path, outputs=job.outputs,
+                  status=job.status, elapsed=round(job.elapsed, 3), error=job.error,
+                  cpu_user=round(job.cpu_user, 3), cpu_system=round(job.cpu_system, 3), peak_rss=job.peak_rss,
+                  fps=job.fps, speed=job.speed, input_bytes=job.input_bytes, output_bytes=job.output_bytes)
+
+    def on_job_progress(self, job):
+        self.emit("job_progress", input=job.input_path, percent=round(job.progress * 100, 1),
+                  fps=job.fps, speed=job.speed)
+
+    def on_progress(self, fraction):
+        # Whole percent steps are plenty for scripts
+        percent = int(fraction * 100)
+        if percent != self._last_progress:
+            self._last_progress = percent
+            self.emit("progress", percent=percent)
+
+
+def build_parser():
+    """Command line interface: python Alchemist.py convert --preset ps3 -o out/ inputs..."""
+    parser = argparse.ArgumentParser(
+        prog="Alchemist.py",
+        description="Alchemist - Media Converter. Run without arguments to open the GUI.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Options shared by convert and watch
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument("--preset", required=True, choices=list(PRESETS), help="conversion preset")
+    options.add_argument("-o", "--output", required=True, help="output folder")
+    options.add_argument("-j", "--jobs", type=int, default=default_worker_count(),
+                         help="number of files converted in parallel (default: %(default)s)")
+    options.add_argument("--quality", choices=["low", "optimal", "high"], default="optimal",
+                         help="XviD quality preset (default: %(default)s)")
+    options.add_argument("--gif-palette", choices=GIF_PALETTE_MODES, default="global",
+                         help="one palette for all GIF frames, or one per frame (default: %(default)s)")
+    options.add_argument("--no-palette-cache", action="store_true",
+                         help="don't reuse GIF palettes built for similar inputs")
+    options.add_argument("--gif-quality", choices=GIF_QUALITIES, default="high",
+                         help="MP4 to GIF: fitted palette in one decode, or FFmpeg's default palette (default: %(default)s)")
+    options.add_argument("--gif-stats-mode", choices=GIF_STATS_MODES, default="diff",
+                         help="palettegen stats_mode for --gif-quality high (default: %(default)s)")
+    options.add_argument("--gif-dither", choices=GIF_DITHERS, default="bayer",
+                         help="paletteuse dithering for --gif-quality high (default: %(default)s)")
+    options.add_argument("--webm-speed", choices=WEBM_SPEEDS, default="good",
+                         help="VP9 speed tier of WebM outputs (default: %(default)s)")
+    options.add_argument("--two-pass", action="store_true",
+                         help="encode MP4 to WebM in two passes (slower, for archival copies)")
+    options.add_argument("--targets", default=",".join(FANOUT_TARGETS),
+                         help="comma-separated outputs of the fan-out preset (default: %(default)s)")
+    options.add_argument("--segments", choices=SEGMENT_MODES, default="auto",
+                         help="encode long XviD/PS3 inputs as parallel chunks; auto = inputs over 10 minutes "
+                              "when fewer files than jobs are queued (default: %(default)s)")
+    options.add_argument("--audio-track", type=int, default=0,
+                         help="audio track index for presets that pick one, unless --audio-lang/--audio-codec/"
+                              "--audio-channels pick it by rules (default: %(default)s)")
+    options.add_argument("--audio-lang", default="",
+                         help="comma-separated preferred audio languages as tagged in the files, e.g. jpn,eng")
+    options.add_argument("--audio-codec", default="", help="comma-separated preferred audio codecs, e.g. dts,ac3")
+    options.add_argument("--audio-channels", choices=CHANNEL_PREFERENCES, default="any",
+                         help="prefer the track with the most channels, or the one closest to stereo")
+    options.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default="skip",
+                         help="what to do with outputs that already exist: keep them, replace them, write to a "
+                              "numbered name, or keep them unless the input changed since (default: %(default)s); "
+                              "overwrite also redoes outputs the journal lists as up to date")
+    options.add_argument("--overwrite", action="store_const", dest="on_conflict", const="overwrite",
+                         help="same as --on-conflict overwrite")
+    options.add_argument("--no-resume", action="store_true",
+                         help="convert files again even if the output folder's journal lists them as up to date "
+                              "(implied by --on-conflict overwrite)")
+    options.add_argument("--no-report", action="store_true",
+                         help="don't write the batch's resource report (alchemist-report-*.csv/.json) to the output folder")
+    options.add_argument("-q", "--quiet", action="store_true", help="don't write log messages to stderr")
+    options.add_argument("--log-level", choices=[name.lower() for name in LOG_LEVELS], default="info",
+                         help="lowest level written to stderr; 'debug' adds progress lines (default: %(default)s)")
+    options.add_argument("--log-file", help="also write the full log (all levels) to this rotating log file")
+
+    convert = subparsers.add_parser("convert", parents=[options], help="convert files headless with one of the presets")
+    convert.add_argument("inputs", nargs="+", help="input files")
+
+    watch = subparsers.add_parser("watch", parents=[options],
+                                  help="convert every file dropped into folders, until stopped with Ctrl+C")
+    watch.add_argument("folders", nargs="+", help="folders to watch")
+    watch.add_argument("--done", help="folder converted inputs are moved to (default: a 'done' folder inside "
+                                      "each watched folder)")
+    watch.add_argument("--stable-seconds", type=float, default=STABLE_SECONDS,
+                       help="seconds a new file must stay unchanged before it is converted (default: %(default)s)")
+
+    subparsers.add_parser("presets", help="list the available presets")
+    return parser
+
+
+def run_cli(args):
+    """Run a headless batch and return the process exit code"""
+    if args.command == "presets":
+        for key, preset in PRESETS.items():
+            print(f"{key}\t{preset.label}")
+        return EXIT_OK
+
+    preset = PRESETS[args.preset]
+    converter = Converter()
+    converter.log_level = logging.CRITICAL + 1 if args.quiet else LOG_LEVELS[args.log_level.capitalize()]
+    if args.log_file:
+        setup_file_logging(args.log_file)
+
+    if preset.needs_ffmpeg and not os.path.exists(FFMPEG_PATH):
+        print(f"FFmpeg not found at: {FFMPEG_PATH}", file=sys.stderr)
+        return EXIT_NO_FFMPEG
+
+    os.makedirs(args.output, exist_ok=True)
+    converter.output_folder = args.output
+    converter.xvid_quality = args.quality
+    converter.gif_palette = args.gif_palette
+    converter.reuse_gif_palettes = not args.no_palette_cache
+    converter.gif_quality = args.gif_quality
+    converter.gif_stats_mode = args.gif_stats_mode
+    converter.gif_dither = args.gif_dither
+    converter.segment_mode = args.segments
+    converter.webm_speed = args.webm_speed
+    converter.webm_two_pass = args.two_pass
+    converter.resume = not args.no_resume
+    converter.conflict_policy = args.on_conflict
+    converter.write_reports = not args.no_report
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = [target for target in targets if target not in FANOUT_TARGETS]
+    if unknown or not targets:
+        print(f"Unknown fan-out targets: {', '.join(unknown) or '(none)'} "
+              f"(choose from {', '.join(FANOUT_TARGETS)})", file=sys.stderr)
+        return EXIT_USAGE
+    converter.fanout_targets = targets
+    converter.scheduler.max_workers = max(1, args.jobs)
+    reporter = JsonProgressReporter(converter.scheduler)
+
+    def output_skipped(output_file, reason):
+        reporter.emit("skipped", output=output_file, reason=reason)
+
+    # Unattended: with track rules, files the rules can't settle get the best guess
+    audio_track = args.audio_track
+    if args.audio_lang or args.audio_codec or args.audio_channels != "any":
+        converter.track_rules = TrackRules(languages=args.audio_lang.split(","), codecs=args.audio_codec.split(","),
+                                           channels=args.audio_channels)
+        audio_track = None
+
+    if args.command == "watch":
+        return run_watch(converter, args, audio_track)
+
+    inputs = []
+    for input_path in args.inputs:
+        if os.path.isfile(input_path):
+            inputs.append(os.path.abspath(input_path))
+        else:
+            print(f"Skipping {input_path}: not a file", file=sys.stderr)
+
+    audio_selections = {}
+    if preset.needs_audio_track:
+        if audio_track is None:
+            audio_selections = converter.guess_audio_tracks(
+                [f for f in inputs if os.path.splitext(f)[1].lower() in preset.extensions])
+        else:
+            audio_selections = {input_path: audio_track for input_path in inputs}
+    jobs = converter.build_jobs(args.preset, inputs, audio_selections, output_skipped)
+    if not jobs:
+        converter.probe_cache.flush()
+        reporter.emit("summary", total=0, successful=0, failed=0, cancelled=0)
+        return EXIT_USAGE if not inputs else EXIT_OK
+
+    # Run the batch on a helper thread so Ctrl+C can stop it cleanly
+    result = {}
+    ok = run_until_interrupted(converter, lambda: result.update(counts=converter.scheduler.run(jobs)))
+
+    converter.probe_cache.flush()
+    converter.report_batch(jobs)
+    successful, failed = result.get("counts", (0, 0))
+    cancelled = sum(1 for job in jobs if job.status == "cancelled")
+    reporter.emit("summary", total=len(jobs), successful=successful, failed=failed, cancelled=cancelled)
+
+    if converter.scheduler.stopped:
+        return EXIT_INTERRUPTED
+    return EXIT_FAILED if failed or not ok else EXIT_OK
+
+
+def run_until_interrupted(converter, work):
+    """Run work() on a helper thread; Ctrl+C stops the scheduler, and this returns once work() has ended.
+
+    Returns False if work() raised (the error is logged), True otherwise.
+    """
+    # Waits on an Event rather than Thread.join: a KeyboardInterrupt landing
+    # inside join() can leave the thread marked as finished while it still runs
+    finished = threading.Event()
+    result = {"ok": False}
+
+    def run():
         try:
-            result = subprocess.run(
-                [FFPROBE_PATH, '-v', 'error', '-select_streams', 'a',
-                 '-show_entries', 'stream=index,codec_name,channels,bit_rate:stream_tags=language,title',
-                 '-of', 'json', input_path],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=30
-            )
-
-            import json
-            data = json.loads(result.stdout)
-            streams = data.get('streams', [])
-
-            # Only one or no tracks — return default
-            if len(streams) <= 1:
-                return 0
-
-            # Build label for each track
-            track_labels = []
-            for i, s in enumerate(streams):
-                tags = s.get('tags', {})
-                lang = tags.get('language', 'unknown')
-                title = tags.get('title', '')
-                codec = s.get('codec_name', '?')
-                channels = s.get('channels', '?')
-                bitrate = s.get('bit_rate', '')
-                bitrate_str = f", {int(bitrate)//1000}k" if str(bitrate).isdigit() else ''
-                label = f"Track {i+1}: [{lang}] {codec} {channels}ch{bitrate_str}"
-                if title:
-                    label += f" — {title}"
-                track_labels.append(label)
-
-            # Show dialog on main thread (we're already on main thread here)
-            selected_index = [0]
-
-            dialog = tk.Toplevel(self.root)
-            dialog.title("Select Audio Track")
-            dialog.geometry("500x300")
-            dialog.grab_set()
-            dialog.resizable(False, False)
-            dialog.focus_force()
-
-            tk.Label(dialog, text=f"Multiple audio tracks found in:\n{os.path.basename(input_path)}",
-                     wraplength=460, justify='left').pack(pady=(15, 5), padx=15)
-
-            listbox = tk.Listbox(dialog, selectmode='single', height=len(track_labels))
-            for label in track_labels:
-                listbox.insert(tk.END, label)
-            listbox.select_set(0)
-            listbox.pack(fill=tk.BOTH, expand=True, padx=15, pady=5)
-
-            def confirm():
-                sel = listbox.curselection()
-                selected_index[0] = sel[0] if sel else 0
-                dialog.destroy()
-
-            def on_close():
-                selected_index[0] = 0
-                dialog.destroy()
-
-            dialog.protocol("WM_DELETE_WINDOW", on_close)
-            tk.Button(dialog, text="Use Selected Track", command=confirm, width=20).pack(pady=10)
-
-            dialog.wait_window()  # Blocks until dialog is closed, safe on main thread
-            return selected_index[0]
-
+            work()
+            result["ok"] = True
         except Exception as e:
-            self.log_message(f"Error reading audio tracks: {e}")
-            return 0
+            converter.log_message(f"Stopped by an unexpected error: {e!r}", logging.ERROR)
+            converter.log_message(traceback.format_exc(), logging.DEBUG)
+        finally:
+            finished.set()
 
-    def get_audio_extension(self, input_path, audio_index):
-        """Return the appropriate file extension for the selected audio track."""
-        try:
-            import json
-            result = subprocess.run(
-                [FFPROBE_PATH, '-v', 'error', '-select_streams', f'a:{audio_index}',
-                 '-show_entries', 'stream=codec_name',
-                 '-of', 'json', input_path],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=30
-            )
-            data = json.loads(result.stdout)
-            streams = data.get('streams', [])
-            if not streams:
-                return '.m4a'
-            
-            codec = streams[0].get('codec_name', '').lower()
-            
-            extension_map = {
-                'aac':    '.aac',
-                'mp3':    '.mp3',
-                'ac3':    '.ac3',
-                'eac3':   '.eac3',
-                'dts':    '.dts',
-                'flac':   '.flac',
-                'opus':   '.opus',
-                'vorbis': '.ogg',
-                'pcm_s16le': '.wav',
-                'pcm_s24le': '.wav',
-                'pcm_f32le': '.wav',
-                'truehd': '.thd',
-            }
-            
-            return extension_map.get(codec, '.mka')  # fallback to .mka (Matroska audio) for unknown codecs
-        
-        except Exception as e:
-            self.log_message(f"Warning: could not detect audio codec, defaulting to .m4a: {e}")
-            return '.m4a'            
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while not finished.wait(0.2):
+            pass
+    except KeyboardInterrupt:
+        converter.scheduler.stop()
+        finished.wait()
+    return result["ok"]
+
+
+def run_watch(converter, args, audio_track):
+    """Watch folders until Ctrl+C and return the process exit code"""
+    missing = [folder for folder in args.folders if not os.path.isdir(folder)]
+    if missing:
+        print(f"Not a folder: {', '.join(missing)}", file=sys.stderr)
+        return EXIT_USAGE
+    error = converter.watch_folders_error(args.folders)
+    if error:
+        print(error, file=sys.stderr)
+        return EXIT_USAGE
+
+    # Watch on a helper thread so Ctrl+C can stop it cleanly
+    ok = run_until_interrupted(converter, partial(converter.watch_folders, args.folders, args.preset, args.done,
+                                                  args.stable_seconds, audio_track))
+    converter.probe_cache.flush()
+    # Ctrl+C is how watching ends, so it is no interruption here
+    return EXIT_FAILED if converter.scheduler.failed or not ok else EXIT_OK
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        parser = build_parser()
+        args = parser.parse_args(argv)
+        if args.command is None:
+            parser.print_help()
+            return EXIT_USAGE
+        return run_cli(args)
+
+    load_gui_toolkits()
+    setup_file_logging()
 
-    def get_audio_delay(self, input_path, audio_index):
-        """
-        Extract audio delay by analyzing edit lists and packet timestamps.
-        This works for MKV files with container-level audio delays.
-        """
-        try:
-            # Get first few audio packets to find the actual PTS (presentation timestamp)
-            result = subprocess.run(
-                [FFPROBE_PATH, '-v', 'error', '-select_streams', f'a:{audio_index}',
-                 '-show_entries', 'packet=pts,pts_time',
-                 '-read_intervals', '%+#10',  # Read first 10 packets
-                 '-of', 'json', input_path],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=30
-            )
-            
-            import json
-            data = json.loads(result.stdout)
-            packets = data.get('packets', [])
-            
-            if packets:
-                # Get the first packet's PTS (presentation timestamp)
-                first_pts = float(packets[0].get('pts_time', 0))
-                if first_pts > 0.1:  # Significant delay
-                    delay_ms = int(first_pts * 1000)
-                    self.log_message(f"Detected audio delay from packets: {delay_ms/1000:.3f}s")
-                    return delay_ms
-            
-            # Fallback: Compare video and audio first packet timestamps
-            video_packets = subprocess.run(
-                [FFPROBE_PATH, '-v', 'error', '-select_streams', 'v:0',
-                 '-show_entries', 'packet=pts_time',
-                 '-read_intervals', '%+#1',
-                 '-of', 'json', input_path],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=30
-            )
-            
-            video_data = json.loads(video_packets.stdout)
-            video_pkts = video_data.get('packets', [])
-            video_pts = float(video_pkts[0].get('pts_time', 0)) if video_pkts else 0
-            
-            audio_pkts = packets
-            audio_pts = float(audio_pkts[0].get('pts_time', 0)) if audio_pkts else 0
-            
-            delay_ms = int((audio_pts - video_pts) * 1000)
-            
-            if abs(delay_ms) > 10:
-                self.log_message(f"Detected audio delay from packet comparison: {delay_ms/1000:.3f}s")
-                return delay_ms
-                
-            return 0
-            
-        except Exception as e:
-            self.log_message(f"Warning: Could not extract audio delay: {e}")
-            return 0
-            
-if __name__ == "__main__":
     # Create root window with drag-and-drop support if available
     if HAS_DND:
         root = TkinterDnD.Tk()
         ttk.Style(theme="minty")
     else:
         root = ttk.Window(themename="minty")
-    
+
     app = VideoConverterApp(root)
     root.mainloop()
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
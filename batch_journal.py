@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+
+from probe_cache import file_key
+
+# Journal file kept in every output folder a batch writes to
+JOURNAL_NAME = ".alchemist-journal.json"
+
+
+def partial_output_path(output_path):
+    """Temporary name a job writes to before its output is moved into place.
+
+    Same folder (so the final rename is atomic) and same extension (FFmpeg
+    picks the container from it), hidden so it is never taken for a result.
+    """
+    folder, name = os.path.split(output_path)
+    base, ext = os.path.splitext(name)
+    return os.path.join(folder, f".{base}.partial{ext}")
+
+
+class BatchJournal:
+    """What was converted into one output folder, kept across runs.
+
+    Every job gets an entry keyed on its main output file name, recording the
+    input fingerprint, the preset and whether it finished. A restarted batch
+    skips outputs that are up to date and redoes everything else, including
+    jobs that were running when the app was closed or crashed.
+    """
+
+    def __init__(self, folder):
+        self.journal_file = os.path.join(folder, JOURNAL_NAME)
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def is_up_to_date(self, input_path, outputs, preset_key):
+        """Whether outputs were completed from this exact input with this preset and are untouched since"""
+        key = os.path.basename(outputs[0])
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+        if entry is None or entry.get('status') != 'done' or entry.get('preset') != preset_key:
+            return False
+        try:
+            if entry.get('input') != file_key(input_path):
+                return False
+            sizes = entry.get('outputs', {})
+            return all(sizes.get(os.path.basename(path)) == os.path.getsize(path) for path in outputs)
+        except OSError:
+            return False
+
+    def status(self, output_path):
+        """Recorded status of an output ('running', 'done', 'failed') or None"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(os.path.basename(output_path))
+        return entry.get('status') if entry else None
+
+    def job_started(self, input_path, outputs, preset_key):
+        """Record a job as running before it writes anything"""
+        self._update(outputs[0], {
+            'input': file_key(input_path),
+            'preset': preset_key,
+            'status': 'running',
+            'outputs': {},
+            'updated': time.time(),
+        })
+
+    def job_finished(self, outputs, ok):
+        """Record a job as done (with its output sizes) or failed"""
+        sizes = {}
+        if ok:
+            sizes = {os.path.basename(path): os.path.getsize(path) for path in outputs if os.path.exists(path)}
+        self._update(outputs[0], {
+            'status': 'done' if ok else 'failed',
+            'outputs': sizes,
+            'updated': time.time(),
+        })
+
+    def _update(self, output_path, fields):
+        with self._lock:
+            self._load()
+            entry = self._entries.setdefault(os.path.basename(output_path), {})
+            entry.update(fields)
+            self._save()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not os.path.exists(self.journal_file):
+            return
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            # A corrupt journal only means every file is converted again
+            self._entries = {}
+
+    def _save(self):
+        try:
+            tmp_file = f"{self.journal_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, indent=1)
+            os.replace(tmp_file, self.journal_file)
+        except OSError:
+            pass
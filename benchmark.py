@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Performance checks run by hand or in CI; each command prints a table,
+# can write its results as JSON and exits with 1 when a budget is exceeded.
+#
+#   python benchmark.py startup      time the GUI and headless start-up paths
+#   python benchmark.py conversions  run every preset on generated media
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules only the WebP conversions need; starting the app must not load them
+HEAVY_MODULES = ("cv2", "numpy", "PIL")
+
+# Start-up paths, each timed in a fresh interpreter: code, heavy modules it may load
+STARTUP_PATHS = {
+    "python": ("pass", HEAVY_MODULES),
+    "headless engine": ("import converter", ()),
+    "command line": ("import sys, Alchemist; sys.argv = ['Alchemist.py', 'presets']; Alchemist.main()", ()),
+    # ttkbootstrap needs Pillow for its images
+    "gui toolkits": ("import Alchemist; Alchemist.load_gui_toolkits()", ("PIL",)),
+}
+STARTUP_BUDGET_MS = 500
+
+
+def run_python(code):
+    """Run code in a fresh interpreter from the app folder; returns (seconds, stdout)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{code!r} failed:\n{result.stderr.strip()}")
+    return elapsed, result.stdout
+
+
+def loaded_heavy_modules(code):
+    """The heavy modules that are imported after running code"""
+    report = f"import sys\nprint('loaded:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    _, output = run_python(f"{code}\n{report}")
+    loaded = output.rsplit("loaded:", 1)[1].strip()
+    return loaded.split(",") if loaded else []
+
+
+def benchmark_startup(args):
+    """Time every start-up path and check it against the budget"""
+    results = {}
+    over_budget = False
+    print(f"{'path':<18}{'median ms':>10}{'min ms':>9}  heavy modules loaded")
+    for name, (code, allowed) in STARTUP_PATHS.items():
+        try:
+            times = [run_python(code)[0] * 1000 for _ in range(args.runs)]
+            heavy = [module for module in loaded_heavy_modules(code) if module not in allowed]
+        except RuntimeError as e:
+            # The GUI toolkits may be missing on a build server
+            print(f"{name:<18}skipped: {e}")
+            continue
+        median = statistics.median(times)
+        failed = name != "python" and (median > args.budget_ms or bool(heavy))
+        over_budget = over_budget or failed
+        results[name] = {"median_ms": round(median, 1), "min_ms": round(min(times), 1),
+                         "heavy_modules": heavy, "within_budget": not failed}
+        print(f"{name:<18}{median:>10.1f}{min(times):>9.1f}  {', '.join(heavy) or '-'}{'  OVER BUDGET' if failed else ''}")
+
+    if args.json:
+        write_json(args.json, {"benchmark": "startup", "python": sys.version.split()[0], "runs": args.runs,
+                               "budget_ms": args.budget_ms, "results": results})
+    return 1 if over_budget else 0
+
+
+def write_json(path, document):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=1)
+
+
+# Conversion benchmark: (name, preset, input, extra arguments of Alchemist.py convert)
+CONVERSION_CASES = (
+    ("webm-mp4", "webm-mp4", "clip.webm", []),
+    ("webp-mp4", "webp-mp4", "anim.webp", []),
+    ("webp-mp4 alpha", "webp-mp4", "anim_alpha.webp", []),
+    ("webp-gif", "webp-gif", "anim.webp", ["--no-palette-cache"]),
+    ("webp-gif alpha", "webp-gif", "anim_alpha.webp", ["--no-palette-cache"]),
+    ("mp4-webm", "mp4-webm", "clip.mp4", []),
+    ("mp4-gif", "mp4-gif", "clip.mp4", []),
+    ("gif-mp4", "gif-mp4", "clip.gif", []),
+    ("ps3", "ps3", "clip.mkv", []),
+    ("extract-audio", "extract-audio", "clip.mkv", []),
+    ("mp3", "mp3", "tone.wav", []),
+    ("xvid", "xvid", "clip.mkv", []),
+    ("fan-out", "fan-out", "clip.mkv", []),
+)
+VIDEO_RATE = 25
+GIF_RATE = 15
+WEBP_FRAME_MS = 100
+REGRESSION_TOLERANCE = 0.15  # a case this much slower than the compared run fails...
+REGRESSION_MIN_SECONDS = 0.1  # ...if it also lost this much time (sub-second cases jitter)
+
+# Runs one conversion in the benchmark's child process and reports its own
+# and its children's (FFmpeg's) resource usage
+MEASURE_CODE = """
+import json, sys, time
+import Alchemist
+sys.argv = ['Alchemist.py'] + {argv!r}
+start = time.perf_counter()
+code = Alchemist.main()
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss = [resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+except ImportError:
+    rss = [None, None]
+print('measured:' + json.dumps([code, elapsed] + rss))
+"""
+
+
+def rss_mb(maxrss):
+    """ru_maxrss in MB: kilobytes on Linux, bytes on macOS"""
+    if maxrss is None:
+        return None
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_ffmpeg(ffmpeg, args):
+    subprocess.run([ffmpeg, "-hide_banner", "-loglevel", "error", "-y", *args], check=True)
+
+
+def generate_inputs(folder, ffmpeg, duration, size):
+    """Write the deterministic benchmark inputs into folder; returns {file name: frame count or None}"""
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    video = ["-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={VIDEO_RATE}:duration={duration}"]
+    tone = ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}"]
+    second_tone = ["-f", "lavfi", "-i", f"sine=frequency=660:sample_rate=48000:duration={duration}"]
+    bitexact = ["-map_metadata", "-1", "-fflags", "+bitexact"]
+
+    run_ffmpeg(ffmpeg, [*video, *tone, "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+                        "-c:a", "aac", "-ac", "2", *bitexact, os.path.join(folder, "clip.mp4")])
+    run_ffmpeg(ffmpeg, [*video, *tone, "-c:v", "libvpx-vp9", "-deadline", "realtime", "-cpu-used", "8",
+                        "-b:v", "1M", "-c:a", "libopus", "-ac", "2", *bitexact, os.path.join(folder, "clip.webm")])
+    # Two tagged audio tracks, like a film with a dub
+    run_ffmpeg(ffmpeg, [*video, *tone, *second_tone, "-map", "0:v", "-map", "1:a", "-map", "2:a",
+                        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-c:a", "ac3", "-ac", "2",
+                        "-metadata:s:a:0", "language=eng", "-metadata:s:a:1", "language=jpn", *bitexact,
+                        os.path.join(folder, "clip.mkv")])
+    run_ffmpeg(ffmpeg, [*tone, "-ac", "2", "-c:a", "pcm_s16le", *bitexact, os.path.join(folder, "tone.wav")])
+    run_ffmpeg(ffmpeg, [*video, "-vf", f"fps={GIF_RATE},scale={width // 2}:-1", *bitexact,
+                        os.path.join(folder, "clip.gif")])
+
+    # Animated WebPs: a square sweeping over a gradient, opaque and with a
+    # transparent background
+    webp_frames = int(duration * 1000 / WEBP_FRAME_MS)
+    webp_size = (width // 2, height // 2)
+    for name, mode in (("anim.webp", "RGB"), ("anim_alpha.webp", "RGBA")):
+        frames = []
+        for i in range(webp_frames):
+            if mode == "RGB":
+                frame = Image.linear_gradient("L").resize(webp_size).convert("RGB")
+            else:
+                frame = Image.new("RGBA", webp_size, (0, 0, 0, 0))
+            draw = ImageDraw.Draw(frame)
+            x = i * (webp_size[0] - 40) // max(1, webp_frames - 1)
+            draw.rectangle([x, 20, x + 40, 60], fill=(255, 64, 32, 200) if mode == "RGBA" else (255, 64, 32))
+            draw.ellipse([webp_size[0] - x - 40, webp_size[1] - 60, webp_size[0] - x, webp_size[1] - 20],
+                         fill=(32, 128, 255, 128) if mode == "RGBA" else (32, 128, 255))
+            frames.append(frame)
+        frames[0].save(os.path.join(folder, name), save_all=True, append_images=frames[1:],
+                       duration=WEBP_FRAME_MS, loop=0, quality=80, method=4)
+
+    video_frames = int(duration * VIDEO_RATE)
+    return {"clip.mp4": video_frames, "clip.webm": video_frames, "clip.mkv": video_frames,
+            "clip.gif": int(duration * GIF_RATE), "anim.webp": webp_frames, "anim_alpha.webp": webp_frames,
+            "tone.wav": None}
+
+
+def run_case(work_dir, preset, input_path, extra_args, jobs):
+    """Convert one input in a fresh process with empty caches; returns the measurements"""
+    out_dir = os.path.join(work_dir, "out")
+    app_data = os.path.join(work_dir, "appdata")
+    for folder in (out_dir, app_data):
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+
+    argv = ["convert", "--preset", preset, input_path, "-o", out_dir, "--jobs", str(jobs), "-q", "--no-report",
+            *extra_args]
+    result = subprocess.run([sys.executable, "-c", MEASURE_CODE.format(argv=argv)], cwd=APP_DIR,
+                            env={**os.environ, "LOCALAPPDATA": app_data}, capture_output=True, text=True)
+    if "measured:" not in result.stdout:
+        raise RuntimeError(result.stderr.strip() or f"exit code {result.returncode}")
+    code, elapsed, self_rss, child_rss = json.loads(result.stdout.rsplit("measured:", 1)[1])
+    outputs = [entry for entry in os.scandir(out_dir) if entry.is_file() and not entry.name.startswith('.')]
+    return {"ok": code == 0 and bool(outputs), "wall_s": elapsed,
+            "output_bytes": sum(entry.stat().st_size for entry in outputs),
+            "peak_rss_mb": rss_mb(self_rss), "ffmpeg_peak_rss_mb": rss_mb(child_rss)}
+
+
+def benchmark_conversions(args):
+    """Run every conversion path on generated inputs and record time, speed, size and memory"""
+    import converter
+
+    if not os.path.exists(converter.FFMPEG_PATH):
+        print(f"FFmpeg not found at: {converter.FFMPEG_PATH}", file=sys.stderr)
+        return 1
+    cases = [case for case in CONVERSION_CASES if not args.only or case[0] in args.only.split(",")]
+    width, height = (int(n) for n in args.size.lower().split("x"))
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="alchemist-bench-")
+    inputs_dir = os.path.join(work_dir, "inputs")
+    os.makedirs(inputs_dir, exist_ok=True)
+    results = {}
+    try:
+        print(f"Generating {args.duration}s {width}x{height} inputs in {inputs_dir}")
+        frame_counts = generate_inputs(inputs_dir, converter.FFMPEG_PATH, args.duration, (width, height))
+
+        print(f"{'case':<16}{'wall s':>8}{'fps':>8}{'output KB':>11}{'RSS MB':>8}{'FFmpeg MB':>10}")
+        for name, preset, input_name, extra_args in cases:
+            runs = []
+            for _ in range(args.runs):
+                try:
+                    runs.append(run_case(work_dir, preset, os.path.join(inputs_dir, input_name), extra_args,
+                                         args.jobs))
+                except RuntimeError as e:
+                    runs.append({"ok": False, "error": str(e)})
+            if not all(run["ok"] for run in runs):
+                results[name] = {"preset": preset, "input": input_name, "ok": False,
+                                 "error": next((run["error"] for run in runs if "error" in run), None)}
+                print(f"{name:<16}FAILED")
+                continue
+
+            wall = statistics.median(run["wall_s"] for run in runs)
+            # Frames per second only mean something for video outputs
+            settings = converter.PRESETS[preset]
+            audio_only = settings.video is None and not settings.video_filter and settings.audio is not None
+            frames = None if audio_only else frame_counts[input_name]
+            peak_rss = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+            ffmpeg_rss = [run["ffmpeg_peak_rss_mb"] for run in runs if run["ffmpeg_peak_rss_mb"] is not None]
+            entry = results[name] = {
+                "preset": preset, "input": input_name, "ok": True,
+                "wall_s": round(wall, 3),
+                "fps": round(frames / wall, 1) if frames else None,
+                "output_bytes": runs[-1]["output_bytes"],
+                "peak_rss_mb": max(peak_rss) if peak_rss else None,
+                "ffmpeg_peak_rss_mb": max(ffmpeg_rss) if ffmpeg_rss else None,
+            }
+            fps = f"{entry['fps']:.1f}" if entry['fps'] else "-"
+            print(f"{name:<16}{entry['wall_s']:>8.2f}{fps:>8}{entry['output_bytes'] / 1024:>11.1f}"
+                  f"{entry['peak_rss_mb'] or 0:>8.1f}{entry['ffmpeg_peak_rss_mb'] or 0:>10.1f}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        ffmpeg_version = subprocess.run([converter.FFMPEG_PATH, "-version"], capture_output=True,
+                                        text=True).stdout.split("\n", 1)[0]
+        write_json(args.json, {"benchmark": "conversions", "python": sys.version.split()[0],
+                               "ffmpeg": ffmpeg_version, "duration": args.duration, "size": args.size,
+                               "runs": args.runs, "jobs": args.jobs, "results": results})
+
+    failed = any(not entry["ok"] for entry in results.values())
+    if args.compare:
+        failed = compare_results(args.compare, results, args.tolerance) or failed
+    return 1 if failed else 0
+
+
+def compare_results(path, results, tolerance):
+    """Print the change in wall time against a previous run; returns whether any case regressed"""
+    with open(path, 'r', encoding='utf-8') as f:
+        previous = json.load(f).get("results", {})
+    regressed = False
+    print(f"\nCompared with {path}:")
+    for name, entry in results.items():
+        before = previous.get(name)
+        if not entry["ok"] or not before or not before.get("ok"):
+            continue
+        change = entry["wall_s"] / before["wall_s"] - 1
+        slower = change > tolerance and entry["wall_s"] - before["wall_s"] > REGRESSION_MIN_SECONDS
+        regressed = regressed or slower
+        print(f"{name:<16}{before['wall_s']:>8.2f} -> {entry['wall_s']:.2f} s ({change:+.0%})"
+              f"{'  REGRESSION' if slower else ''}")
+    return regressed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Alchemist performance benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    startup = subparsers.add_parser("startup", help="time the start-up paths against the import-time budget")
+    startup.add_argument("--runs", type=int, default=5, help="runs per path, the median counts (default: %(default)s)")
+    startup.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS,
+                         help="slowest acceptable median start-up time (default: %(default)s)")
+    startup.add_argument("--json", help="also write the results to this JSON file")
+    startup.set_defaults(run=benchmark_startup)
+
+    conversions = subparsers.add_parser("conversions", help="run every preset on generated media")
+    conversions.add_argument("--only", help="comma-separated cases to run (default: all)")
+    conversions.add_argument("--duration", type=float, default=5, help="seconds of generated media (default: %(default)s)")
+    conversions.add_argument("--size", default="640x360", help="frame size of the generated video (default: %(default)s)")
+    conversions.add_argument("--runs", type=int, default=1,
+                             help="runs per case, the median wall time counts (default: %(default)s)")
+    conversions.add_argument("-j", "--jobs", type=int, default=1,
+                             help="parallel jobs given to the converter (default: %(default)s)")
+    conversions.add_argument("--work-dir", help="keep the generated inputs and last outputs in this folder")
+    conversions.add_argument("--json", help="also write the results to this JSON file")
+    conversions.add_argument("--compare", help="results JSON of an earlier run; fail on slower cases")
+    conversions.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                             help="allowed slow-down against --compare, as a fraction (default: %(default)s)")
+    conversions.set_defaults(run=benchmark_conversions)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
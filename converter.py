@@ -0,0 +1,1554 @@
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
+from batch_journal import BatchJournal, partial_output_path
+from hot_folder import POLL_INTERVAL, STABLE_SECONDS, FolderWatcher, move_to_done
+from job_metrics import format_summary, job_record, summarize, write_report
+from output_conflicts import OutputConflicts
+from preset_registry import load_presets
+from probe_cache import ProbeCache
+from process_control import popen_options, wait_for_exit
+from stream_rules import check_stream
+from track_rules import TrackRules, track_key, track_label, track_layout
+from scheduler import Job, JobScheduler, default_worker_count
+
+
+def resource_path(relative_path):
+    """ Get the absolute path to a resource, works for dev and for PyInstaller """
+    try:
+        base_path = sys._MEIPASS
+    except AttributeError:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+
+def app_data_dir():
+    """Per-user folder for caches and settings that outlive a session"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "Alchemist")
+
+
+def find_binary(name):
+    """Return the bundled FFmpeg binary, falling back to one on PATH (render servers)"""
+    bundled = resource_path(f"ffmpeg/bin/{name}.exe")
+    if os.path.exists(bundled):
+        return bundled
+    return shutil.which(name) or bundled
+
+
+# Full log history goes through this logger; see setup_file_logging()
+logger = logging.getLogger("alchemist")
+logger.setLevel(logging.DEBUG)
+logger.addHandler(logging.NullHandler())
+
+# Size and number of rotated log files kept on disk
+LOG_FILE_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+
+
+def setup_file_logging(log_file=None):
+    """Write every log message (all levels) to a rotating log file. Returns its path."""
+    log_file = log_file or os.path.join(app_data_dir(), "logs", "alchemist.log")
+    os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(message)s"))
+    logger.addHandler(handler)
+    return log_file
+
+
+# Paths to FFmpeg binaries (essential for the GIF/MP4 conversions)
+FFMPEG_PATH = find_binary("ffmpeg")
+FFPROBE_PATH = find_binary("ffprobe")
+
+# Seconds between two progress updates of a running FFmpeg job, and between
+# two "Progress:" log lines. FFmpeg itself reports about twice a second.
+PROGRESS_INTERVAL = 0.5
+PROGRESS_LOG_INTERVAL = 10.0
+
+# Decoded frames buffered between the WebP decoder and FFmpeg's stdin
+FRAME_QUEUE_SIZE = 8
+
+# Output frame rate range of WebP to MP4. The WebP's frames are repeated to
+# fill their durations on this grid, which x264 encodes almost for free, so
+# a fine grid keeps short frames that come after a long first frame.
+WEBP_MIN_FPS = 30
+WEBP_MAX_FPS = 60
+
+# Upper bound of memory used per pixel while a WebP frame becomes a GIF frame:
+# decoded RGBA (4) + reused white canvas (3) + canvas as an array (3)
+# + palette lookup codes (2) + palettized frame (1) + encoded frame data (~1)
+GIF_BYTES_PER_PIXEL = 14
+
+# GIF palette modes: one palette shared by all frames (built from sampled
+# frames, smaller files without flicker) or an adaptive palette per frame
+GIF_PALETTE_MODES = ("global", "per-frame")
+
+# MP4 to GIF: "high" decodes once and splits the frames between palettegen
+# (one palette fitted to the clip) and paletteuse; "standard" is a plain
+# single pass with FFmpeg's default palette
+GIF_QUALITIES = ("high", "standard")
+GIF_STATS_MODES = ("diff", "full", "single")  # palettegen stats_mode
+GIF_DITHERS = ("bayer", "sierra2_4a", "floyd_steinberg", "none")  # paletteuse dither
+
+VIDEO_EXTENSIONS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.ts', '.m4v', '.mpg', '.mpeg'}
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.flac', '.aac', '.m4a', '.ogg', '.wma', '.aiff', '.alac', '.ac3'}
+
+# Conversion presets (see preset_registry.py): the built-in ones bundled by
+# PyInstaller or next to this module, tuned or extended by the user's own file
+PRESETS_FILE = os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))), "presets.json")
+USER_PRESETS_FILE = os.path.join(app_data_dir(), "presets.json")
+
+
+def load_all_presets():
+    """Built-in presets plus the user's presets.json, ignoring the latter if it is invalid"""
+    groups = {"video": VIDEO_EXTENSIONS, "audio": AUDIO_EXTENSIONS}
+    try:
+        return load_presets(PRESETS_FILE, groups, USER_PRESETS_FILE)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring {USER_PRESETS_FILE}: {e}")
+        return load_presets(PRESETS_FILE, groups)
+
+
+PRESETS = load_all_presets()
+
+# Inputs only the in-process presets read (with Pillow), never FFmpeg
+PILLOW_EXTENSIONS = (
+    {ext for preset in PRESETS.values() if not preset.needs_ffmpeg for ext in preset.extensions}
+    - {ext for preset in PRESETS.values() if preset.needs_ffmpeg for ext in preset.extensions}
+)
+
+# Outputs a fan-out job can write from one decode of its input
+FANOUT_TARGETS = ("mp4", "webm", "gif", "audio")
+
+# VP9 speed tiers (the WebM preset's "qualities"): realtime is ~15x faster
+# than the old untuned encode, good ~2.4x at a 2% larger size, best is the
+# slowest and smallest (archival, with two-pass)
+WEBM_SPEEDS = ("realtime", "good", "best")
+VP9_TILE_WIDTH = 256  # narrowest tile column VP9 allows, in pixels
+VP9_MAX_TILE_COLUMNS = 6  # log2: up to 64 columns
+
+# Segment-parallel encoding of long single inputs (XviD, PS3 re-encode):
+# the video is cut at keyframes into chunks encoded on parallel FFmpeg
+# processes. "auto" does it when the file queue leaves workers idle and the
+# input is long enough, "always" for every input.
+SEGMENT_MODES = ("auto", "always", "off")
+SEGMENT_MIN_DURATION = 600.0  # seconds; shorter inputs are encoded in one piece
+SEGMENT_MIN_LENGTH = 30.0     # seconds per chunk at least
+SEGMENTS_PER_WORKER = 4       # several chunks per process even out their speed differences
+
+# ffprobe runs at the same time while files are added or a batch is prepared;
+# probing mostly waits on the disk, so this is not tied to the core count
+PROBE_WORKERS = 4
+
+
+def filter_args(video_filter):
+    """-vf arguments for a preset's filter chain, if it has one"""
+    return ['-vf', video_filter] if video_filter else []
+
+
+def probe_summary(info):
+    """One line describing probed media: duration, codecs and audio track count"""
+    if info is None:
+        return "unreadable"
+    parts = []
+    try:
+        hours, rest = divmod(int(float(info['format']['duration'])), 3600)
+        minutes, seconds = divmod(rest, 60)
+        parts.append(f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}")
+    except (KeyError, TypeError, ValueError):
+        pass
+    streams = info.get('streams', [])
+    codecs = [s.get('codec_name', '?') for s in streams if s.get('codec_type') in ('video', 'audio')]
+    if codecs:
+        parts.append("/".join(dict.fromkeys(codecs)))
+    audio_tracks = sum(1 for s in streams if s.get('codec_type') == 'audio')
+    if audio_tracks > 1:
+        parts.append(f"{audio_tracks} audio tracks")
+    return ", ".join(parts)
+
+
+def gif_memory_ceiling(width, height):
+    """Peak bytes a streaming WebP to GIF job needs, independent of the frame count"""
+    return width * height * GIF_BYTES_PER_PIXEL
+
+
+# Pillow, NumPy (and gif_palette, built on it) and OpenCV are only needed by
+# the WebP conversions, so they are imported by the first one that runs and
+# the GUI and the command line start without them
+Image = GifImagePlugin = np = cv2 = None
+SAMPLE_FRAMES = PaletteBuilder = PaletteCache = apply_palette = palette_lut = None
+_lazy_import_lock = threading.Lock()
+
+
+def load_image_modules():
+    """Import Pillow, NumPy and gif_palette"""
+    global Image, GifImagePlugin, np, SAMPLE_FRAMES, PaletteBuilder, PaletteCache, apply_palette, palette_lut
+    with _lazy_import_lock:
+        if palette_lut is not None:
+            return
+        import numpy as np
+        from PIL import GifImagePlugin, Image
+        from gif_palette import SAMPLE_FRAMES, PaletteBuilder, PaletteCache, apply_palette, palette_lut
+
+
+def load_opencv():
+    """Import OpenCV, used only when FFmpeg is missing"""
+    global cv2
+    with _lazy_import_lock:
+        if cv2 is None:
+            import cv2
+
+
+class Converter:
+    """Conversion engine shared by the GUI and the headless command line.
+
+    Holds everything needed to turn a list of files into jobs and run them,
+    without touching any GUI toolkit. Front-ends override log_message to
+    route messages where they belong.
+    """
+
+    def __init__(self):
+        self.output_folder = ""
+        self.xvid_quality = "optimal"
+        self.log_level = logging.INFO  # messages below this level only go to the log file
+        self.scheduler = JobScheduler()
+        self.probe_cache = ProbeCache(FFPROBE_PATH, os.path.join(app_data_dir(), "probe_cache.json"))
+        self.probe_pool = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="alchemist-probe")
+        self.gif_palette = "global"
+        self.reuse_gif_palettes = True  # share global palettes between similar inputs
+        self._palette_cache = None  # created by the first global GIF palette, see get_palette_cache
+        self.gif_quality = "high"
+        self.gif_stats_mode = "diff"
+        self.gif_dither = "bayer"
+        self.fanout_targets = FANOUT_TARGETS
+        self.segment_mode = "auto"
+        self.webm_speed = "good"
+        self.webm_two_pass = False
+        self.track_rules = TrackRules()
+        self.resume = True  # skip outputs the folder's journal lists as up to date
+        self.conflict_policy = "skip"  # see output_conflicts.CONFLICT_POLICIES
+        self.write_reports = True  # resource report of every batch in its output folder
+        self._journals = {}
+        self._journals_lock = threading.Lock()
+        self._palette_cache_lock = threading.Lock()
+
+    def log_message(self, message, level=logging.INFO):
+        """Log message to the log file and, if its level is high enough, show it with a timestamp"""
+        logger.log(level, message)
+        if level >= self.log_level:
+            timestamp = time.strftime("%H:%M:%S")
+            self.display_log(f"[{timestamp}] {message}")
+
+    def display_log(self, line):
+        """Show a log line to the user (stderr; the GUI overrides this)"""
+        print(line, file=sys.stderr, flush=True)
+
+    def build_jobs(self, preset_key, files, audio_selections=None, on_skipped=None):
+        """Turn the input files accepted by a preset into a list of Jobs.
+
+        Existing outputs are handled by self.conflict_policy without asking;
+        on_skipped(output_file, reason) is told about every output left alone.
+        """
+        preset = PRESETS[preset_key]
+        audio_selections = audio_selections or {}
+        conflicts = OutputConflicts(self.conflict_policy)
+        conflict_count = 0
+        if preset.needs_ffmpeg:
+            # Probe the batch in parallel up front instead of one file at a time below
+            self.prefetch_probes([f for f in files if os.path.splitext(f)[1].lower() in preset.extensions])
+
+        jobs = []
+        for input_path in files:
+            if self.scheduler.stopped:
+                break
+
+            file_ext = os.path.splitext(input_path)[1].lower()
+            self.log_message(f"Processing: {os.path.basename(input_path)} (ext: {file_ext})", logging.DEBUG)
+            if file_ext not in preset.extensions:
+                self.log_message(f"Skipping: extension {file_ext} not accepted by {preset_key}", logging.DEBUG)
+                continue
+
+            # Skip inputs already in the target format (optional - you might want to re-encode anyway)
+            if file_ext in preset.skip_extensions:
+                self.log_message(f"Skipping {os.path.basename(input_path)} (already {file_ext[1:].upper()})")
+                continue
+
+            base_name = os.path.splitext(os.path.basename(input_path))[0]
+            audio_index = audio_selections.get(input_path, 0)
+
+            if preset.suffix == "@audio-codec":
+                self.log_message(f"Audio index selected: {audio_index}")
+                suffix = self.get_audio_extension(input_path, audio_index)
+                self.log_message(f"Detected audio extension: {suffix}")
+            else:
+                suffix = preset.suffix
+            output_file = os.path.join(self.output_folder, base_name + suffix)
+
+            outputs = [output_file]
+            if preset.targets:
+                outputs = self.get_fanout_outputs(input_path, audio_index)
+                if not outputs:
+                    self.log_message(f"Skipping {os.path.basename(input_path)}: no fan-out targets apply")
+                    continue
+
+            journal = self.journal_for(outputs[0])
+            # Overwriting asks for fresh outputs, whatever the journal says
+            resume = self.resume and self.conflict_policy != "overwrite"
+            if resume and journal.is_up_to_date(input_path, outputs, preset_key):
+                self.log_message(f"Skipping {os.path.basename(input_path)}: output is up to date")
+                if on_skipped is not None:
+                    for path in outputs:
+                        on_skipped(path, "up to date")
+                continue
+            if journal.status(outputs[0]) in ("running", "failed"):
+                self.log_message(f"Resuming unfinished job for {os.path.basename(input_path)}")
+
+            resolved, existing = conflicts.resolve(input_path, outputs)
+            if existing:
+                conflict_count += 1
+                names = ", ".join(os.path.basename(path) for path in existing)
+                if resolved is None:
+                    reason = "newer" if self.conflict_policy == "skip-if-newer" else "exists"
+                    detail = "is newer than the input" if reason == "newer" else "already exists"
+                    self.log_message(f"Skipping {os.path.basename(input_path)}: {names} {detail}")
+                    if on_skipped is not None:
+                        for path in existing:
+                            on_skipped(path, reason)
+                    continue
+                if resolved != outputs:
+                    self.log_message(f"{names} already exists, writing "
+                                     f"{', '.join(os.path.basename(path) for path in resolved)}")
+                else:
+                    self.log_message(f"Overwriting {names}", logging.DEBUG)
+                outputs = resolved
+
+            work = getattr(self, preset.method, None)
+            if work is None:
+                self.log_message(f"Preset {preset_key} names an unknown method {preset.method}", logging.ERROR)
+                return []
+            if preset.needs_audio_track:
+                work = partial(work, audio_index=audio_index)
+            work = partial(self.run_journaled, preset_key, work)
+            jobs.append(Job(input_path, outputs[0], work, extra_outputs=outputs[1:], preset=preset_key))
+
+        if conflict_count:
+            self.log_message(f"{conflict_count} file(s) had existing outputs ({self.conflict_policy})")
+        return jobs
+
+    def report_batch(self, jobs):
+        """Log the resource summary of a finished batch and write its CSV/JSON report.
+
+        Returns the summary text, or None if no job ran.
+        """
+        records = [job_record(job) for job in jobs if job.started_at is not None]
+        if not records:
+            return None
+        text = format_summary(summarize(records))
+        self.log_message(f"Resources used:\n{text}")
+        if self.write_reports and self.output_folder:
+            try:
+                csv_path, _ = write_report(records, self.output_folder)
+                self.log_message(f"Resource report: {os.path.splitext(csv_path)[0]}.csv/.json")
+            except OSError as e:
+                self.log_message(f"Could not write the resource report: {e}", logging.WARNING)
+        return text
+
+    def watch_folders(self, folders, preset_key, done_folder=None, stable_seconds=STABLE_SECONDS, audio_track=None):
+        """Convert every file dropped into folders with a preset, until the scheduler is stopped.
+
+        Files are queued as soon as they are completely written, while
+        earlier ones are still converting, and each converted input is moved
+        to done_folder (default: a "done" folder inside its watched folder).
+        Audio tracks come from the track rules, or audio_track if given.
+        Returns the resource summary of the session (see report_batch).
+        """
+        preset = PRESETS[preset_key]
+        error = self.watch_folders_error(folders)
+        if error:
+            self.log_message(error, logging.ERROR)
+            return None
+        watcher = FolderWatcher(folders, preset.extensions, stable_seconds)
+        handled = []
+
+        def next_jobs():
+            files = watcher.poll()
+            if not files:
+                return []
+            self.log_message(f"New in watched folders: {', '.join(os.path.basename(f) for f in files)}")
+            try:
+                audio_selections = {}
+                if preset.needs_audio_track:
+                    if audio_track is None:
+                        audio_selections = self.guess_audio_tracks(files)
+                    else:
+                        audio_selections = {input_path: audio_track for input_path in files}
+                jobs = self.build_jobs(preset_key, files, audio_selections)
+            except Exception:
+                watcher.retry(files)  # not lost: tried again after another stable period
+                raise
+            for job in jobs:
+                job.work = partial(self.run_and_move_input, job.work, done_folder)
+            handled.extend(jobs)
+            return jobs
+
+        self.log_message(f"Watching {', '.join(folders)} for {preset.label} "
+                         f"(files are taken once unchanged for {stable_seconds:g}s)")
+        def poll_failed(error):
+            self.log_message(f"Error while checking the watched folders: {error}", logging.ERROR)
+
+        successful, failed = self.scheduler.run_incremental(next_jobs, POLL_INTERVAL, poll_failed)
+        self.log_message(f"Stopped watching. {successful} file(s) {preset.verb}, {failed} failed.")
+        return self.report_batch(handled)
+
+    def watch_folders_error(self, folders):
+        """Why folders can't be watched with the current output folder, or None"""
+        watched = {os.path.abspath(folder) for folder in folders}
+        if os.path.abspath(self.output_folder) in watched:
+            # Its own outputs would be taken for new inputs
+            return "The output folder can't be one of the watched folders"
+        return None
+
+    def run_and_move_input(self, work, done_folder, job):
+        """Run a watched file's job and move the input out of the watched folder once it converted"""
+        ok = work(job)
+        if ok:
+            try:
+                target = move_to_done(job.input_path, done_folder)
+                self.log_message(f"Moved {os.path.basename(job.input_path)} to {os.path.dirname(target)}",
+                                 logging.DEBUG)
+            except OSError as e:
+                self.log_message(f"Could not move {os.path.basename(job.input_path)} to the done folder: {e}",
+                                 logging.WARNING)
+        return ok
+
+    def journal_for(self, output_path):
+        """The batch journal of the folder an output is written to"""
+        folder = os.path.dirname(os.path.abspath(output_path))
+        with self._journals_lock:
+            if folder not in self._journals:
+                self._journals[folder] = BatchJournal(folder)
+            return self._journals[folder]
+
+    def run_journaled(self, preset_key, work, job):
+        """Run a job's work on temporary output names, moving them into place only on success.
+
+        An interrupted job never leaves a file under its final name, and the
+        journal records it as unfinished so the next run redoes it.
+        """
+        outputs = job.outputs
+        journal = self.journal_for(outputs[0])
+        journal.job_started(job.input_path, outputs, preset_key)
+
+        job.temp_outputs = [partial_output_path(path) for path in outputs]
+        ok = False
+        try:
+            # Work that ran into a stop may have been cut short whatever it reported:
+            # it is never moved into place or journaled as done
+            ok = bool(work(job)) and not self.scheduler.stopped
+            if ok:
+                for partial_path, output_path in zip(job.temp_outputs, outputs):
+                    os.replace(partial_path, output_path)
+        except OSError as e:
+            self.log_message(f"Could not move {os.path.basename(job.input_path)}'s output into place: {e}",
+                             logging.ERROR)
+            ok = False
+        finally:
+            partial_paths, job.temp_outputs = job.temp_outputs, None
+            if not ok:
+                for partial_path in partial_paths:
+                    try:
+                        os.remove(partial_path)
+                    except OSError:
+                        pass
+            journal.job_finished(outputs, ok)
+        return ok
+
+    def run_ffmpeg_command(self, command, input_path, job=None, feed=None, report_progress=True):
+        """Run an FFmpeg argument list (no shell) with error handling and progress output.
+
+        The process's CPU time and peak memory are charged to job; its
+        progress is reported as the job's unless report_progress is False
+        (one of several processes working on the same job).
+        feed(stdin) is optional; it runs on its own thread and writes the
+        input FFmpeg reads from pipe:0 (binary stream, closed afterwards).
+        """
+        process = None
+        try:
+            # Machine-readable key=value progress on stdout instead of the stats line on stderr
+            command = [command[0], '-progress', 'pipe:1', '-nostats'] + list(command[1:])
+            self.log_message(f"Executing: {subprocess.list2cmdline(command)}")
+            duration = self.get_duration(input_path) if feed is None else None
+
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE if feed is not None else None,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                **popen_options()
+            )
+            # Pause suspends the process and Stop kills it, even mid-file
+            self.scheduler.add_process(process)
+
+            # Drain stderr on a helper thread so neither pipe can fill up and block FFmpeg
+            stderr_reader = threading.Thread(target=self._log_ffmpeg_errors, args=(process.stderr,), daemon=True)
+            stderr_reader.start()
+            feeder = None
+            if feed is not None:
+                feeder = threading.Thread(target=self._feed_ffmpeg, args=(feed, process.stdin), daemon=True)
+                feeder.start()
+
+            stats = {}
+            last_update = 0.0
+            last_log = 0.0
+            for line in process.stdout:
+                key, sep, value = line.partition('=')
+                if not sep:
+                    continue
+                key = key.strip()
+                if key != 'progress':
+                    if key in ('out_time_us', 'fps', 'speed'):
+                        stats[key] = value.strip()
+                    continue
+
+                # A "progress=" line closes each block; only act on a few of them
+                now = time.monotonic()
+                if value.strip() != 'end' and now - last_update < PROGRESS_INTERVAL:
+                    continue
+                last_update = now
+                log_it = now - last_log >= PROGRESS_LOG_INTERVAL
+                if log_it:
+                    last_log = now
+                self._report_ffmpeg_progress(job if report_progress else None, stats, duration, log_it)
+
+            usage = wait_for_exit(process)
+            if job is not None:
+                job.add_usage(usage.get('user', 0.0), usage.get('system', 0.0), usage.get('peak_rss'), process=True)
+            stderr_reader.join()
+            if feeder is not None:
+                feeder.join()
+
+            if process.returncode == 0:
+                return True
+            elif self.scheduler.stopped:
+                self.log_message(f"Stopped {os.path.basename(input_path)}")
+                return False
+            else:
+                self.log_message(f"FFmpeg error for {os.path.basename(input_path)}: return code {process.returncode}", logging.ERROR)
+                return False
+
+        except Exception as e:
+            self.log_message(f"FFmpeg error for {os.path.basename(input_path)}: {str(e)}", logging.ERROR)
+            return False
+        finally:
+            if process is not None:
+                self.scheduler.remove_process(process)
+
+    def _feed_ffmpeg(self, feed, stdin):
+        try:
+            feed(stdin.buffer)
+        except (OSError, ValueError):
+            pass  # FFmpeg went away early; its return code says why
+        finally:
+            try:
+                stdin.close()
+            except (OSError, ValueError):
+                pass
+
+    def _log_ffmpeg_errors(self, stream):
+        for line in stream:
+            if 'error' in line.lower():
+                self.log_message(f"FFmpeg: {line.strip()}", logging.WARNING)
+
+    def _report_ffmpeg_progress(self, job, stats, duration, log_it):
+        """Turn one block of FFmpeg -progress output into job progress"""
+        try:
+            position = int(stats.get('out_time_us', '')) / 1_000_000
+        except ValueError:
+            position = None
+        try:
+            fps = float(stats.get('fps', ''))
+        except ValueError:
+            fps = None
+        try:
+            speed = float(stats.get('speed', '').rstrip('x'))
+        except ValueError:
+            speed = None
+
+        percent = None
+        if position is not None and duration:
+            percent = min(100.0, position / duration * 100)
+
+        if job is not None:
+            job.fps = fps
+            job.speed = speed
+            if percent is not None:
+                self.scheduler.set_job_progress(job, percent / 100)
+            elif self.scheduler.on_job_progress:
+                self.scheduler.on_job_progress(job)
+
+        if log_it and position is not None:
+            hours, rest = divmod(position, 3600)
+            minutes, seconds = divmod(rest, 60)
+            details = f"Progress: {int(hours):02d}:{int(minutes):02d}:{seconds:05.2f}"
+            if percent is not None:
+                details += f" ({percent:.0f}%)"
+            if fps is not None:
+                details += f", {fps:.1f} fps"
+            if speed is not None:
+                details += f", {speed:.2f}x"
+            self.log_message(details, logging.DEBUG)
+
+    def probe_in_background(self, input_path, callback=None):
+        """Probe a file on the probe pool; callback(input_path, info or None) runs on the pool thread"""
+        def probe():
+            try:
+                info = self.probe_cache.get(input_path)
+            except Exception as e:
+                self.log_message(f"Could not analyze {os.path.basename(input_path)}: {e}", logging.DEBUG)
+                info = None
+            if callback is not None:
+                callback(input_path, info)
+            return info
+        return self.probe_pool.submit(probe)
+
+    def prefetch_probes(self, files):
+        """Probe files in parallel (cached ones cost nothing) and wait until all are done"""
+        wait([self.probe_in_background(input_path) for input_path in files])
+
+    def get_duration(self, input_path):
+        """Duration of a file in seconds from the probe cache, or None if unknown"""
+        try:
+            return float(self.probe_cache.get(input_path)['format']['duration'])
+        except Exception:
+            return None
+
+    def get_start_time(self, input_path):
+        """Timestamp (seconds) the file's container starts at, 0.0 if unknown; non-zero in most .ts/.mpg files"""
+        try:
+            return float(self.probe_cache.get(input_path)['format']['start_time'])
+        except Exception:
+            return 0.0
+
+    def convert_to_old_device_file(self, job, audio_index):
+        """Convert a single video to XviD AVI"""
+        input_path, output_file = job.input_path, job.write_path
+        preset = PRESETS[job.preset]
+        self.log_message(f"Selected audio track index: {audio_index}")
+
+        # Get audio delay for the selected track
+        audio_delay_ms = self.get_audio_delay(input_path, audio_index)
+
+        video_args = self.get_xvid_video_settings(preset)
+        audio_args = preset.audio_args()
+        shortest = []
+
+        # Only apply adelay for POSITIVE delays (audio starts after video)
+        # Negative delays mean audio starts earlier - ignore them for vintage conversion
+        if audio_delay_ms > 0:
+            delay_seconds = audio_delay_ms / 1000.0
+            self.log_message(f"Applying audio delay of {delay_seconds:.3f} seconds using adelay")
+            audio_args = ['-af', f'adelay={audio_delay_ms}|{audio_delay_ms}'] + audio_args
+            shortest = ['-shortest']
+        elif audio_delay_ms < 0:
+            self.log_message(f"Ignoring negative audio delay of {audio_delay_ms/1000:.3f}s (audio starts before video)")
+
+        if self.should_segment(input_path):
+            success = self.encode_segmented(job, video_args, audio_args, audio_index,
+                                            video_filter=preset.video_filter,
+                                            mux_args=preset.output_args + shortest)
+        else:
+            command = [FFMPEG_PATH, '-y', '-i', input_path,
+                       '-map', '0:v:0', '-map', f'0:a:{audio_index}', '-sn',
+                       *filter_args(preset.video_filter), *video_args, *audio_args,
+                       *preset.output_args, *shortest, output_file]
+            success = self.run_ffmpeg_command(command, input_path, job)
+
+        if success:
+            self.log_message(f"Successfully converted {os.path.basename(input_path)}")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)}")
+        return False
+
+    def should_segment(self, input_path):
+        """Whether a long input should be encoded as parallel chunks"""
+        if self.segment_mode == "off":
+            return False
+        if self.segment_mode == "always":
+            return True
+        # Parallel files already keep the workers busy
+        if len(self.scheduler.jobs) >= self.scheduler.max_workers:
+            return False
+        duration = self.get_duration(input_path)
+        return duration is not None and duration >= SEGMENT_MIN_DURATION
+
+    def keyframe_times(self, input_path):
+        """Timestamps (seconds) of the video keyframes, read from packet flags without decoding"""
+        try:
+            result = subprocess.run(
+                [FFPROBE_PATH, '-v', 'error', '-select_streams', 'v:0',
+                 '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', input_path],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=600
+            )
+        except (OSError, subprocess.SubprocessError):
+            return []
+        times = []
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags:
+                try:
+                    times.append(float(pts_time))
+                except ValueError:
+                    pass
+        return sorted(times)
+
+    def get_segment_bounds(self, input_path, segment_time):
+        """Chunk start times (source timestamps): the first keyframe after every segment_time seconds"""
+        keyframes = self.keyframe_times(input_path)
+        duration = self.get_duration(input_path) or 0.0
+        start_time = self.get_start_time(input_path)
+        if not keyframes:
+            # No packet flags (unusual container): cut anywhere, seeking stays frame accurate
+            keyframes = [start_time + segment_time * i for i in range(int(duration // segment_time) + 1)]
+        bounds = [keyframes[0]]
+        for time_s in keyframes:
+            if time_s - bounds[-1] >= segment_time and duration - (time_s - start_time) >= SEGMENT_MIN_LENGTH / 2:
+                bounds.append(time_s)
+        return bounds
+
+    def encode_segmented(self, job, video_args, audio_args, audio_index, video_filter=None,
+                         mux_args=(), audio_offset=0.0):
+        """Encode a video as keyframe-aligned chunks on parallel FFmpeg processes.
+
+        Every chunk seeks straight to its keyframe in the source and is
+        encoded with video_args, the audio track is encoded once with
+        audio_args, and the pieces are joined with stream copy (plus mux_args).
+        """
+        input_path, output_file = job.input_path, job.write_path
+        name = os.path.basename(input_path)
+        # Share the cores with the other files of the batch
+        workers = max(2, default_worker_count() // max(1, len(self.scheduler.jobs)))
+        duration = self.get_duration(input_path) or SEGMENT_MIN_LENGTH
+        segment_time = max(SEGMENT_MIN_LENGTH, duration / (workers * SEGMENTS_PER_WORKER))
+        bounds = self.get_segment_bounds(input_path, segment_time)
+        self.log_message(f"Encoding {name} as {len(bounds)} chunks of ~{segment_time:.0f}s "
+                         f"on {workers} parallel FFmpeg processes")
+
+        work_dir = tempfile.mkdtemp(prefix=".alchemist-", dir=os.path.dirname(os.path.abspath(output_file)))
+        try:
+            audio_file = os.path.join(work_dir, "audio.mka")
+            commands = [
+                [FFMPEG_PATH, '-y', '-i', input_path, '-map', f'0:a:{audio_index}', '-vn', *audio_args, audio_file]
+            ]
+            chunk_ext = os.path.splitext(output_file)[1]
+            # The bounds are source timestamps, and so are the frames trim sees with
+            # -copyts, but an input -ss counts from the container's start time
+            start_time = self.get_start_time(input_path)
+            chunks = []
+            for index, start in enumerate(bounds):
+                end = bounds[index + 1] if index + 1 < len(bounds) else None
+                # -copyts keeps source timestamps, so filters such as fps land on the
+                # same grid as in a single pass, and trim cuts exactly at the bounds
+                trim = f"trim=start={start:.6f}" + (f":end={end:.6f}" if end is not None else "")
+                filters = ",".join(f for f in (video_filter, trim, "setpts=PTS-STARTPTS") if f)
+                # Read a second past the end so the last frames before it are complete
+                length = ['-t', f'{end - start + 1:.6f}'] if end is not None else []
+                chunks.append(os.path.join(work_dir, f"chunk{index:05d}{chunk_ext}"))
+                seek = max(0.0, start - start_time)
+                commands.append(
+                    [FFMPEG_PATH, '-y', '-copyts', '-ss', f'{seek:.6f}', *length, '-i', input_path,
+                     '-map', '0:v:0', '-vf', filters, *video_args, '-an', chunks[-1]]
+                )
+
+            finished = []
+            lock = threading.Lock()
+
+            def run_piece(command):
+                if not self.scheduler.wait_while_paused():
+                    return False
+                ok = self.run_ffmpeg_command(command, input_path, job, report_progress=False)
+                with lock:
+                    finished.append(ok)
+                    self.scheduler.set_job_progress(job, len(finished) / (len(commands) + 1))
+                return ok
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alchemist-chunk") as pool:
+                results = list(pool.map(run_piece, commands))
+            if not all(results) or self.scheduler.stopped:
+                return False
+
+            list_file = os.path.join(work_dir, "chunks.txt")
+            with open(list_file, 'w', encoding='utf-8') as f:
+                for path in chunks:
+                    escaped = path.replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+
+            offset = ['-itsoffset', f'{audio_offset:.3f}'] if audio_offset else []
+            concat_command = [
+                FFMPEG_PATH, '-y', '-f', 'concat', '-safe', '0', '-i', list_file, *offset, '-i', audio_file,
+                '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', *mux_args, output_file
+            ]
+            return self.run_ffmpeg_command(concat_command, input_path, job, report_progress=False)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def get_xvid_video_settings(self, preset):
+        """Return the video encoder arguments of the selected XviD quality level"""
+        message = preset.qualities.get(self.xvid_quality, {}).get("message")
+        if message:
+            self.log_message(message)
+        return preset.video_args(self.xvid_quality)
+
+    def webp_to_mp4(self, input_path, output_path, job=None):
+        """Convert animated WebP to H.264 MP4 by streaming raw frames into FFmpeg.
+
+        Frames are decoded once and handed through a small bounded queue to a
+        writer feeding FFmpeg's stdin, so decoding and encoding overlap. The
+        output runs at WEBP_MIN_FPS..WEBP_MAX_FPS and every frame is repeated
+        to keep its on-screen time; a frame shorter than one output frame is
+        still shown once. Falls back to the OpenCV writer when FFmpeg is not
+        available.
+        """
+        if not os.path.exists(FFMPEG_PATH):
+            return self.webp_to_mp4_opencv(input_path, output_path)
+
+        try:
+            load_image_modules()
+            webp = Image.open(input_path)
+        except Exception as e:
+            self.log_message(f"Error converting {os.path.basename(input_path)}: {str(e)}")
+            return False
+
+        with webp:
+            # Check if it's animated
+            if not getattr(webp, 'is_animated', False):
+                self.log_message(f"{os.path.basename(input_path)} is not animated. Skipping.")
+                return False
+
+            width, height = webp.size
+            frame_count = webp.n_frames
+            # Hand Pillow's decoded buffer straight to FFmpeg when the mode allows it
+            if webp.mode == 'RGBA':
+                pix_fmt, convert_mode = 'rgba', None
+            elif webp.mode == 'RGB':
+                pix_fmt, convert_mode = 'rgb24', None
+            else:
+                pix_fmt, convert_mode = 'rgb24', 'RGB'
+
+            def frame_bytes():
+                return webp.convert(convert_mode).tobytes() if convert_mode else webp.tobytes()
+
+            try:
+                first_frame = frame_bytes()  # decoding fills in the frame duration
+            except Exception as e:
+                self.log_message(f"Error converting {os.path.basename(input_path)}: {str(e)}")
+                return False
+            fps = max(WEBP_MIN_FPS, min(WEBP_MAX_FPS, 1000.0 / max(1, webp.info.get('duration', 100))))
+            self.log_message(f"Streaming {frame_count} frames at {fps:.2f} FPS")
+
+            frames = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+            abort = threading.Event()
+            state = {"written": 0, "error": None}
+
+            def decode_frames():
+                elapsed_ms = 0
+                last_update = 0.0
+                try:
+                    for frame_index in range(frame_count):
+                        if abort.is_set() or not self.scheduler.wait_while_paused():
+                            break
+                        if frame_index == 0:
+                            data = first_frame
+                        else:
+                            webp.seek(frame_index)
+                            data = frame_bytes()
+                        elapsed_ms += webp.info.get('duration', 100)
+
+                        # Repeat the frame so output time tracks the WebP timestamps. A frame
+                        # shorter than the grid is never dropped: later frames catch up instead
+                        target = max(state["written"] + 1, round(elapsed_ms * fps / 1000))
+                        while state["written"] < target and not abort.is_set():
+                            frames.put(data)
+                            state["written"] += 1
+
+                        now = time.monotonic()
+                        if job is not None and now - last_update >= PROGRESS_INTERVAL:
+                            last_update = now
+                            self.scheduler.set_job_progress(job, (frame_index + 1) / frame_count)
+                except Exception as e:
+                    state["error"] = e
+                finally:
+                    frames.put(None)
+
+            def write_frames(stdin):
+                broken = False
+                while True:
+                    data = frames.get()
+                    if data is None:
+                        break
+                    if broken:
+                        continue  # keep draining so the decoder never blocks
+                    try:
+                        stdin.write(data)
+                    except OSError:
+                        broken = True
+                        abort.set()
+
+            decoder = threading.Thread(target=decode_frames, daemon=True)
+            decoder.start()
+
+            preset = PRESETS[job.preset if job is not None else "webp-mp4"]
+            command = [
+                FFMPEG_PATH, '-y', '-f', 'rawvideo', '-pix_fmt', pix_fmt, '-s', f'{width}x{height}',
+                '-framerate', f'{fps:.6f}', '-i', 'pipe:0',
+                *filter_args(preset.video_filter), *preset.video_args(), *preset.output_args, '-an', output_path
+            ]
+            ok = self.run_ffmpeg_command(command, input_path, job, feed=write_frames)
+
+            # If FFmpeg never started, nobody drained the queue: release the decoder
+            abort.set()
+            while decoder.is_alive():
+                try:
+                    frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+            if state["error"] is not None:
+                self.log_message(f"Error converting {os.path.basename(input_path)}: {state['error']}")
+                return False
+            if self.scheduler.stopped or not ok:
+                return False
+
+            self.log_message(f"Successfully wrote {frame_count} frames as {state['written']} at {fps:.2f} FPS.")
+            return True
+
+    def webp_to_mp4_opencv(self, input_path, output_path):
+        """Convert WebP to MP4 using PIL and OpenCV (from script 1)"""
+        try:
+            load_image_modules()
+            load_opencv()
+            webp = Image.open(input_path)
+            width, height = webp.size
+
+            # Check if it's animated
+            if not getattr(webp, 'is_animated', False):
+                self.log_message(f"{os.path.basename(input_path)} is not animated. Skipping.")
+                return False
+
+            total_duration_ms = 0
+            frame_count = webp.n_frames
+
+            # Calculate total duration and average FPS
+            for i in range(frame_count):
+                webp.seek(i)
+                total_duration_ms += webp.info.get('duration', 100)
+
+            average_fps = frame_count / (total_duration_ms / 1000.0)
+            clamped_fps = max(5, min(60, average_fps))
+            self.log_message(f"Calculated FPS: {average_fps:.2f}, Using: {clamped_fps:.2f}")
+
+            # Create video writer
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            out = cv2.VideoWriter(output_path, fourcc, clamped_fps, (width, height))
+
+            # Write each frame
+            try:
+                for frame_index in range(frame_count):
+                    if not self.scheduler.wait_while_paused():
+                        break
+
+                    webp.seek(frame_index)
+                    frame_cv = cv2.cvtColor(np.array(webp.convert('RGB')), cv2.COLOR_RGB2BGR)
+                    out.write(frame_cv)
+            finally:
+                out.release()
+
+            self.log_message(f"Successfully wrote {frame_count} frames at {clamped_fps:.2f} FPS.")
+            return True
+
+        except Exception as e:
+            self.log_message(f"Error converting {os.path.basename(input_path)}: {str(e)}")
+            return False
+
+    def webp_to_gif(self, input_path, output_path, job=None):
+        """Convert animated WebP to animated GIF with perfect transparency handling and high quality.
+
+        Each frame is palettized and appended to the output file as soon as it
+        is decoded, so peak memory depends on the frame size only, never on
+        the number of frames.
+        """
+        try:
+            load_image_modules()
+            with Image.open(input_path) as webp:
+                # Check if it's animated
+                if not getattr(webp, 'is_animated', False):
+                    self.log_message(f"{os.path.basename(input_path)} is not animated. Skipping.")
+                    return False
+
+                width, height = webp.size
+                frame_count = webp.n_frames
+                ceiling_mb = gif_memory_ceiling(width, height) / (1024 * 1024)
+                self.log_message(f"GIF memory ceiling for {os.path.basename(input_path)}: ~{ceiling_mb:.1f} MB")
+
+                # The container's alpha flag covers every frame, so a transparent
+                # frame later in the animation is never missed. Every frame is
+                # composited into this one reused canvas.
+                canvas = Image.new('RGB', webp.size, (255, 255, 255))
+
+                lut = None
+                if self.gif_palette == "global":
+                    palette = self.build_global_gif_palette(webp, canvas, input_path)
+                    if palette is None:
+                        return False
+                    lut = palette_lut(palette)
+                    palette_bytes = palette.tobytes()
+
+                last_update = 0.0
+                with open(output_path, 'wb') as fp:
+                    # Process all frames
+                    for frame_index in range(frame_count):
+                        if not self.scheduler.wait_while_paused():
+                            break
+
+                        frame = self.gif_frame_rgb(webp, frame_index, canvas)
+
+                        if lut is not None:
+                            # Map the frame onto the shared palette with a lookup table
+                            indices = apply_palette(np.asarray(frame), lut)
+                            frame = Image.frombytes('P', frame.size, indices.tobytes())
+                            frame.putpalette(palette_bytes)
+                        else:
+                            # Convert to palette mode with high quality settings
+                            # Use Image.ADAPTIVE for better color preservation
+                            frame = frame.convert('P', palette=Image.ADAPTIVE, colors=256, dither=Image.NONE)
+
+                        if frame_index == 0:
+                            # GIF header, global palette and loop forever
+                            header, _ = GifImagePlugin.getheader(frame, info={'loop': 0})
+                            fp.write(b"".join(header))
+
+                        # Per-frame palettes go in a local color table; the shared
+                        # palette is already in the header
+                        for chunk in GifImagePlugin.getdata(
+                                frame,
+                                duration=webp.info.get('duration', 100),
+                                disposal=2,  # Restore to background color between frames
+                                include_color_table=lut is None):
+                            fp.write(chunk)
+
+                        now = time.monotonic()
+                        if job is not None and now - last_update >= PROGRESS_INTERVAL:
+                            last_update = now
+                            self.scheduler.set_job_progress(job, (frame_index + 1) / frame_count)
+
+                    fp.write(b";")  # GIF trailer
+
+                if self.scheduler.stopped:
+                    os.remove(output_path)
+                    return False
+
+                self.log_message(f"Successfully converted {frame_count} frames to high-quality GIF.")
+                return True
+
+        except Exception as e:
+            self.log_message(f"Error converting {os.path.basename(input_path)} to GIF: {str(e)}")
+            return False
+
+    def gif_frame_rgb(self, webp, frame_index, canvas):
+        """Decode one WebP frame into the RGB canvas, compositing transparent pixels onto white"""
+        webp.seek(frame_index)
+        webp.load()
+
+        if webp.mode == 'RGBA':
+            # PROPER transparency handling: composite onto white background
+            # This preserves semi-transparent pixels by blending them properly;
+            # the frame's own alpha channel is the paste mask, so nothing is split
+            canvas.paste((255, 255, 255), (0, 0) + canvas.size)
+            canvas.paste(webp, (0, 0), webp)
+        else:
+            # No transparency, just copy the RGB pixels
+            canvas.paste(webp, (0, 0))
+        return canvas
+
+    def get_palette_cache(self):
+        """The cache of shared GIF palettes, loaded on first use"""
+        with self._palette_cache_lock:
+            if self._palette_cache is None:
+                self._palette_cache = PaletteCache(os.path.join(app_data_dir(), "gif_palettes.json"))
+            return self._palette_cache
+
+    def build_global_gif_palette(self, webp, canvas, input_path):
+        """Build (or reuse) one 256 color palette from frames sampled across the animation.
+
+        Returns None if the batch was stopped while sampling.
+        """
+        frame_count = webp.n_frames
+        samples = min(SAMPLE_FRAMES, frame_count)
+        builder = PaletteBuilder()
+        for frame_index in sorted({round(i) for i in np.linspace(0, frame_count - 1, samples)}):
+            if not self.scheduler.wait_while_paused():
+                return None
+            builder.add_frame(np.asarray(self.gif_frame_rgb(webp, frame_index, canvas)))
+
+        name = os.path.basename(input_path)
+        signature = builder.signature()
+        palette = self.get_palette_cache().find(signature) if self.reuse_gif_palettes else None
+        if palette is not None:
+            self.log_message(f"Reusing the GIF palette of a similar input for {name}", logging.DEBUG)
+            return palette
+
+        palette = builder.palette()
+        self.log_message(f"Built a {len(palette)} color GIF palette for {name} from {samples} frames",
+                         logging.DEBUG)
+        if self.reuse_gif_palettes:
+            self.get_palette_cache().add(signature, palette)
+        return palette
+
+    def convert_webp_to_gif_file(self, job):
+        """Convert a single WebP file to GIF"""
+        if self.webp_to_gif(job.input_path, job.write_path, job):
+            self.log_message(f"Successfully converted {os.path.basename(job.input_path)} to GIF")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(job.input_path)} to GIF")
+        return False
+
+    def convert_webp_to_mp4_file(self, job):
+        """Convert a single WebP file to MP4"""
+        if self.webp_to_mp4(job.input_path, job.write_path, job):
+            self.log_message(f"Successfully converted {os.path.basename(job.input_path)}")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(job.input_path)}")
+        return False
+
+    def convert_audio_to_mp3_file(self, job):
+        """Convert a single audio file to 320k MP3"""
+        input_path, output_file = job.input_path, job.write_path
+        preset = PRESETS[job.preset]
+        audio_args = ['-c:a', 'copy'] if self.can_stream_copy("mp3", input_path, "audio") else preset.audio_args()
+        command = [FFMPEG_PATH, '-y', '-i', input_path, *audio_args, *preset.output_args, output_file]
+
+        if self.run_ffmpeg_command(command, input_path, job):
+            self.log_message(f"Successfully converted {os.path.basename(input_path)} to MP3")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)} to MP3")
+        return False
+
+    def convert_mp4_to_gif_file(self, job):
+        """Convert a single MP4 file to GIF"""
+        input_path, output_file = job.input_path, job.write_path
+        option = "-filter_complex" if self.gif_quality == "high" else "-vf"
+        command = [FFMPEG_PATH, '-y', '-i', input_path, option, self.get_gif_filter(PRESETS[job.preset]), output_file]
+
+        if self.run_ffmpeg_command(command, input_path, job):
+            self.log_message(f"Successfully converted {os.path.basename(input_path)}")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)}")
+        return False
+
+    def get_gif_filter(self, preset):
+        """Filter graph turning decoded video into GIF frames, for the selected GIF quality"""
+        if self.gif_quality == "high":
+            return self.get_gif_palette_filter(preset.video_filter)
+        return preset.video_filter
+
+    def get_gif_palette_filter(self, video_filter):
+        """Filter graph that decodes once and builds the GIF palette from the same frames"""
+        # "single" makes a palette per frame, which paletteuse has to pick up as it goes
+        new_palette = ":new=1" if self.gif_stats_mode == "single" else ""
+        dither = self.gif_dither
+        if dither == "bayer":
+            dither += ":bayer_scale=5"  # the lightest bayer pattern: less noise, smaller files
+        return (f"{video_filter},split[frames][sample];"
+                f"[sample]palettegen=stats_mode={self.gif_stats_mode}[palette];"
+                f"[frames][palette]paletteuse=dither={dither}:diff_mode=rectangle{new_palette}")
+
+    def convert_gif_to_mp4_file(self, job):
+        """Convert a single GIF file to MP4"""
+        input_path, output_file = job.input_path, job.write_path
+        preset = PRESETS[job.preset]
+        if self.can_stream_copy("mp4", input_path, "video"):
+            video_args = ['-c:v', 'copy']
+        else:
+            video_args = filter_args(preset.video_filter) + preset.video_args()
+        command = [FFMPEG_PATH, '-y', '-i', input_path, *video_args, *preset.output_args, output_file]
+
+        if self.run_ffmpeg_command(command, input_path, job):
+            self.log_message(f"Successfully converted {os.path.basename(input_path)}")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)}")
+        return False
+
+    def convert_mp4_to_webm_file(self, job):
+        """Convert a single MP4 file to WebM"""
+        input_path, output_file = job.input_path, job.write_path
+        preset = PRESETS[job.preset]
+
+        # Copy the streams WebM already accepts, encode the others with the preset's settings
+        copy_video = self.can_stream_copy("webm", input_path, "video")
+        video_args = ['-c:v', 'copy'] if copy_video else self.get_webm_video_args(preset, input_path)
+        audio_args = ['-c:a', 'copy'] if self.can_stream_copy("webm", input_path, "audio") else preset.audio_args()
+        command = [FFMPEG_PATH, '-y', '-i', input_path, '-map', '0:v:0', '-map', '0:a:0?',
+                   *video_args, *audio_args, *preset.output_args, output_file]
+
+        if not copy_video and self.webm_two_pass:
+            success = self.run_two_pass(job, video_args, command)
+        else:
+            success = self.run_ffmpeg_command(command, input_path, job)
+
+        if success:
+            self.log_message(f"Successfully converted {os.path.basename(input_path)} to WebM")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)} to WebM")
+        return False
+
+    def get_webm_video_args(self, preset, input_path):
+        """WebM encoder arguments for the selected speed tier, tiled and threaded to the input's size"""
+        args = preset.video_args(self.webm_speed)
+        if preset.video.get("codec") != "libvpx-vp9":
+            return args
+
+        # Tile columns (log2) let row-mt spread one frame over several cores
+        try:
+            width = int(self.probe_cache.streams(input_path, 'video')[0]['width'])
+        except Exception:
+            width = 0
+        tile_columns = 0
+        while tile_columns < VP9_MAX_TILE_COLUMNS and width >= VP9_TILE_WIDTH << (tile_columns + 1):
+            tile_columns += 1
+        # Share the cores with the other files encoded at the same time
+        parallel = max(1, min(self.scheduler.max_workers, len(self.scheduler.jobs)))
+        threads = max(1, (os.cpu_count() or 1) // parallel)
+        self.log_message(f"VP9 {self.webm_speed} speed: {1 << tile_columns} tile columns, {threads} threads",
+                         logging.DEBUG)
+        return args + ['-tile-columns', str(tile_columns), '-threads', str(threads)]
+
+    def run_two_pass(self, job, video_args, command):
+        """Run an encode as two passes: a video-only analysis pass, then command as the second pass"""
+        input_path = job.input_path
+        work_dir = tempfile.mkdtemp(prefix=".alchemist-",
+                                    dir=os.path.dirname(os.path.abspath(job.write_path)))
+        try:
+            pass_args = ['-passlogfile', os.path.join(work_dir, "pass")]
+            self.log_message(f"First pass (analysis) of {os.path.basename(input_path)}")
+            first_pass = [FFMPEG_PATH, '-y', '-i', input_path, '-map', '0:v:0', *video_args,
+                          '-pass', '1', *pass_args, '-an', '-f', 'null', '-']
+            if not self.run_ffmpeg_command(first_pass, input_path, job, report_progress=False):
+                return False
+            second_pass = command[:-1] + ['-pass', '2', *pass_args, command[-1]]
+            return self.run_ffmpeg_command(second_pass, input_path, job)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def convert_webm_to_mp4_file(self, job):
+        """Convert a single WebM file to MP4"""
+        input_path, output_file = job.input_path, job.write_path
+        preset = PRESETS[job.preset]
+
+        # Copy the streams MP4 already accepts, encode the others with the preset's settings
+        video_args = ['-c:v', 'copy'] if self.can_stream_copy("mp4", input_path, "video") else preset.video_args()
+        audio_args = ['-c:a', 'copy'] if self.can_stream_copy("mp4", input_path, "audio") else preset.audio_args()
+        command = [FFMPEG_PATH, '-y', '-i', input_path, '-map', '0:v:0', '-map', '0:a:0?',
+                   *video_args, *audio_args, *preset.output_args, output_file]
+
+        if self.run_ffmpeg_command(command, input_path, job):
+            self.log_message(f"Successfully converted {os.path.basename(input_path)} to MP4")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)} to MP4")
+        return False
+
+    def get_fanout_outputs(self, input_path, audio_index):
+        """Output paths of a fan-out job, one per selected target that the input can feed"""
+        base_name = os.path.splitext(os.path.basename(input_path))[0]
+        has_audio = self.has_audio_track(input_path, audio_index)
+        outputs = []
+        for target in self.fanout_targets:
+            if target == "audio":
+                if not has_audio:
+                    continue
+                suffix = self.get_audio_extension(input_path, audio_index)
+            else:
+                suffix = f".{target}"
+            output_file = os.path.join(self.output_folder, base_name + suffix)
+            # Never write over the source (an MP4 fanned out next to itself)
+            if os.path.abspath(output_file) == os.path.abspath(input_path):
+                output_file = os.path.join(self.output_folder, f"{base_name}_out{suffix}")
+            outputs.append(output_file)
+        return outputs
+
+    def convert_fanout_file(self, job, audio_index):
+        """Decode a single video once and encode it to every fan-out target in the same FFmpeg run"""
+        input_path = job.input_path
+        has_audio = self.has_audio_track(input_path, audio_index)
+        audio_map = ['-map', f'0:a:{audio_index}']
+        # The encoder settings of the single-target presets, one output each
+        target_presets = {target: PRESETS[key] for target, key in PRESETS[job.preset].targets.items()}
+
+        decoded_outputs = []  # (target, output file, audio args) fed from the shared decode
+        output_args = []
+        for output_file in job.write_paths:
+            target = os.path.splitext(output_file)[1][1:].lower()
+            if target in ('mp4', 'webm'):
+                preset = target_presets[target]
+                audio_args = []
+                if has_audio:
+                    copy_audio = self.can_stream_copy(target, input_path, "audio", audio_index)
+                    audio_args = audio_map + (['-c:a', 'copy'] if copy_audio else preset.audio_args())
+                if self.can_stream_copy(target, input_path, "video"):
+                    # Already in the target codec: remuxed, this output needs no decode
+                    output_args += ['-map', '0:v:0', '-c:v', 'copy', *audio_args, *preset.output_args, output_file]
+                    continue
+                decoded_outputs.append((target, output_file, audio_args))
+            elif target == 'gif':
+                decoded_outputs.append((target, output_file, []))
+            else:
+                output_args += [*audio_map, '-vn', '-c:a', 'copy', output_file]
+
+        # One decode of the video stream, split between the outputs that re-encode it
+        labels = [f'v{i}' for i in range(len(decoded_outputs))]
+        graph = [f'[0:v:0]split={len(labels)}' + ''.join(f'[{label}]' for label in labels)]
+        for label, (target, output_file, audio_args) in zip(labels, decoded_outputs):
+            preset = target_presets[target]
+            if target == 'gif':
+                graph.append(f'[{label}]{self.get_gif_filter(preset)}[{label}out]')
+                output_args += ['-map', f'[{label}out]', output_file]
+            else:
+                video_args = self.get_webm_video_args(preset, input_path) if target == 'webm' else preset.video_args()
+                output_args += ['-map', f'[{label}]', *audio_args, *video_args, *preset.output_args, output_file]
+
+        command = [FFMPEG_PATH, '-y', '-i', input_path]
+        if decoded_outputs:
+            command += ['-filter_complex', ";".join(graph)]
+        command += output_args
+        self.log_message(f"Running command: {subprocess.list2cmdline(command)}", logging.DEBUG)
+
+        names = ", ".join(os.path.basename(path) for path in job.outputs)
+        if self.run_ffmpeg_command(command, input_path, job):
+            self.log_message(f"Successfully converted {os.path.basename(input_path)} to {names}")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)} to {names}")
+        return False
+
+    def convert_mkv_to_mp4_ps3_file(self, job, audio_index):
+        """Convert a single video to a PS3 compatible MP4"""
+        input_path, output_file = job.input_path, job.write_path
+        preset = PRESETS[job.preset]
+        self.log_message(f"Selected audio track index: {audio_index}")
+
+        # Analyze video stream
+        needs_video_reencode, reason = self.needs_ps3_video_reencode(input_path)
+        self.log_message(f"Video re-encode needed: {needs_video_reencode} ({reason})")
+
+        video_args = preset.video_args() if needs_video_reencode else ['-c:v', 'copy']
+
+        # Audio re-encoded to stereo AAC for PS3 safety, unless it already is
+        if self.can_stream_copy("ps3", input_path, "audio", audio_index):
+            audio_args = ['-c:a', 'copy']
+        else:
+            audio_args = preset.audio_args()
+
+        if needs_video_reencode and self.should_segment(input_path):
+            # The joined video starts at zero, so the audio start offset is applied when joining
+            audio_offset = self.get_audio_delay(input_path, audio_index) / 1000
+            success = self.encode_segmented(job, video_args, audio_args, audio_index,
+                                            mux_args=preset.output_args, audio_offset=audio_offset)
+        else:
+            output_args = preset.output_args if needs_video_reencode else []
+            command = [FFMPEG_PATH, '-y', '-i', input_path,
+                       '-map', '0:v:0', '-map', f'0:a:{audio_index}', '-sn',
+                       *video_args, *audio_args, *output_args, output_file]
+            success = self.run_ffmpeg_command(command, input_path, job)
+
+        if success:
+            mode = "re-encoded" if needs_video_reencode else "remuxed"
+            self.log_message(f"Successfully {mode} {os.path.basename(input_path)} for PS3")
+            return True
+        self.log_message(f"Failed to convert {os.path.basename(input_path)}")
+        return False
+
+    def needs_ps3_video_reencode(self, input_path):
+        """Check if video stream needs re-encoding for PS3. Returns (bool, reason)."""
+        try:
+            streams = self.probe_cache.streams(input_path, 'video')
+            if not streams:
+                return True, "no video stream found"
+
+            copy, reason = check_stream("ps3", streams[0])
+            return not copy, reason
+
+        except Exception as e:
+            return True, f"analysis error: {e}"
+
+    def can_stream_copy(self, target, input_path, codec_type, index=0):
+        """Whether the index-th stream of a type can be copied into target as is (logs why)"""
+        name = os.path.basename(input_path)
+        try:
+            streams = self.probe_cache.streams(input_path, codec_type)
+            if index >= len(streams):
+                self.log_message(f"{name}: no {codec_type} stream {index}", logging.DEBUG)
+                return False
+            copy, reason = check_stream(target, streams[index])
+        except Exception as e:
+            copy, reason = False, f"analysis error: {e}"
+        # Per stream, per call: detail for the debug log, the job's own result line stays at INFO
+        self.log_message(f"{name}: {codec_type} stream {index} {'copied' if copy else 're-encoded'} ({reason})",
+                         logging.DEBUG)
+        return copy
+
+    def extract_audio_file(self, job, audio_index):
+        """Copy one audio track out of a single video file"""
+        input_path, output_file = job.input_path, job.write_path
+        preset = PRESETS[job.preset]
+        command = [FFMPEG_PATH, '-y', '-i', input_path, '-map', f'0:a:{audio_index}', '-vn',
+                   *preset.audio_args(), *preset.output_args, output_file]
+        self.log_message(f"Running command: {subprocess.list2cmdline(command)}", logging.DEBUG)
+
+        if self.run_ffmpeg_command(command, input_path, job):
+            self.log_message(f"Successfully extracted audio from {os.path.basename(input_path)}")
+            return True
+        self.log_message(f"FAILED to extract audio from {os.path.basename(input_path)}")
+        return False
+
+    def select_audio_tracks(self, files):
+        """Pick an audio track for every file with the track rules.
+
+        Returns (selections, ambiguous). selections maps files to track
+        indexes; ambiguous maps each file the rules could not settle to
+        {'streams', 'guess', 'followers'}, where followers are later files
+        with the same track layout that take the same choice (see
+        apply_track_choices).
+        """
+        rules = self.track_rules
+        selections, ambiguous = {}, {}
+        pending_layouts = {}  # track layout -> ambiguous file it waits on
+        previous = None
+        for input_path in files:
+            name = os.path.basename(input_path)
+            try:
+                streams = self.probe_audio_tracks(input_path)
+            except Exception as e:
+                self.log_message(f"Error reading audio tracks of {name}: {e}")
+                streams = []
+
+            layout = track_layout(streams)
+            if rules.same_as_previous and layout in pending_layouts:
+                ambiguous[pending_layouts[layout]]['followers'].append(input_path)
+                continue
+
+            index, guess, reason = rules.select(streams, previous)
+            if index is None:
+                ambiguous[input_path] = {'streams': streams, 'guess': guess, 'followers': []}
+                pending_layouts[layout] = input_path
+                continue
+
+            selections[input_path] = index
+            if len(streams) > 1:
+                self.log_message(f"{name}: {track_label(index, streams[index])} ({reason})")
+                previous = track_key(streams[index])
+        return selections, ambiguous
+
+    def apply_track_choices(self, selections, ambiguous, choices):
+        """Add the tracks chosen for ambiguous files (file -> index) to selections, followers included"""
+        for input_path, entry in ambiguous.items():
+            index = choices.get(input_path, entry['guess'])
+            for path in [input_path] + entry['followers']:
+                selections[path] = index
+        return selections
+
+    def guess_audio_tracks(self, files):
+        """Pick audio tracks with the track rules and nobody to ask: ambiguous files get the best guess"""
+        self.prefetch_probes(files)
+        selections, ambiguous = self.select_audio_tracks(files)
+        for input_path, entry in ambiguous.items():
+            self.log_message(f"{os.path.basename(input_path)}: no rule decides the audio track, "
+                             f"using {track_label(entry['guess'], entry['streams'][entry['guess']])}",
+                             logging.WARNING)
+        return self.apply_track_choices(selections, ambiguous, {})
+
+    def probe_audio_tracks(self, input_path):
+        """Return the ffprobe stream entries for every audio track in a file"""
+        return self.probe_cache.streams(input_path, 'audio')
+
+    def has_audio_track(self, input_path, audio_index):
+        """Whether a file has the audio track audio_index; an unreadable file has none"""
+        try:
+            return audio_index < len(self.probe_audio_tracks(input_path))
+        except Exception as e:
+            # Its FFmpeg run fails the job (and only this job) with FFmpeg's own error
+            self.log_message(f"Error reading audio tracks of {os.path.basename(input_path)}: {e}", logging.WARNING)
+            return False
+
+    def get_audio_extension(self, input_path, audio_index):
+        """Return the appropriate file extension for the selected audio track."""
+        try:
+            streams = self.probe_audio_tracks(input_path)
+            if audio_index >= len(streams):
+                return '.m4a'
+
+            codec = streams[audio_index].get('codec_name', '').lower()
+
+            extension_map = {
+                'aac':    '.aac',
+                'mp3':    '.mp3',
+                'ac3':    '.ac3',
+                'eac3':   '.eac3',
+                'dts':    '.dts',
+                'flac':   '.flac',
+                'opus':   '.opus',
+                'vorbis': '.ogg',
+                'pcm_s16le': '.wav',
+                'pcm_s24le': '.wav',
+                'pcm_f32le': '.wav',
+                'truehd': '.thd',
+            }
+
+            return extension_map.get(codec, '.mka')  # fallback to .mka (Matroska audio) for unknown codecs
+
+        except Exception as e:
+            self.log_message(f"Warning: could not detect audio codec, defaulting to .m4a: {e}")
+            return '.m4a'
+
+    def get_audio_delay(self, input_path, audio_index):
+        """
+        Extract audio delay by analyzing edit lists and packet timestamps.
+        This works for MKV files with container-level audio delays.
+        """
+        try:
+            # First packet PTS (presentation timestamp) of the selected audio track
+            audio_streams = self.probe_audio_tracks(input_path)
+            audio_pts = None
+            if audio_index < len(audio_streams):
+                audio_pts = self.probe_cache.first_pts(input_path, audio_streams[audio_index].get('index'))
+
+            if audio_pts is not None and audio_pts > 0.1:  # Significant delay
+                delay_ms = int(audio_pts * 1000)
+                self.log_message(f"Detected audio delay from packets: {delay_ms/1000:.3f}s")
+                return delay_ms
+
+            # Fallback: Compare video and audio first packet timestamps
+            video_streams = self.probe_cache.streams(input_path, 'video')
+            video_pts = None
+            if video_streams:
+                video_pts = self.probe_cache.first_pts(input_path, video_streams[0].get('index'))
+
+            delay_ms = int(((audio_pts or 0) - (video_pts or 0)) * 1000)
+
+            if abs(delay_ms) > 10:
+                self.log_message(f"Detected audio delay from packet comparison: {delay_ms/1000:.3f}s")
+                return delay_ms
+
+            return 0
+
+        except Exception as e:
+            self.log_message(f"Warning: Could not extract audio delay: {e}")
+            return 0
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Colors are histogrammed on a 5-5-5 bit RGB grid (32768 bins): fine enough for
+# a 256 color palette, small enough to scan with NumPy in a few milliseconds
+BITS = 5
+SHIFT = 8 - BITS
+BINS = 1 << (3 * BITS)
+
+# Frames sampled (evenly spread over the animation) to build a global palette
+SAMPLE_FRAMES = 16
+
+# Coarse 3-3-3 bit histogram used to recognise similar inputs in the palette cache
+SIGNATURE_BITS = 3
+
+# Histogram intersection (0..1) above which a cached palette is reused
+REUSE_SIMILARITY = 0.97
+
+
+def color_codes(rgb):
+    """15-bit histogram bin of every pixel of an (h, w, 3) uint8 array"""
+    # Shift while still uint8, then widen one channel at a time
+    quantized = rgb >> SHIFT
+    codes = quantized[..., 0].astype(np.uint16) << (2 * BITS)
+    codes |= quantized[..., 1].astype(np.uint16) << BITS
+    codes |= quantized[..., 2]
+    return codes
+
+
+class PaletteBuilder:
+    """Accumulate a color histogram over sample frames and median-cut it to a palette.
+
+    Every bin keeps the pixel count and the sum of the exact colors that fell
+    in it, so palette entries are real averages (pure white stays 255, 255, 255)
+    rather than bin centres.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(BINS, dtype=np.int64)
+        self.sums = np.zeros((BINS, 3), dtype=np.float64)
+
+    def add_frame(self, rgb):
+        """Add the pixels of an (h, w, 3) uint8 frame to the histogram"""
+        codes = color_codes(rgb).ravel()
+        pixels = rgb.reshape(-1, 3)
+        self.counts += np.bincount(codes, minlength=BINS)
+        for channel in range(3):
+            self.sums[:, channel] += np.bincount(codes, weights=pixels[:, channel], minlength=BINS)
+
+    def signature(self):
+        """Normalised coarse histogram, comparable between inputs of any size"""
+        shift = BITS - SIGNATURE_BITS
+        codes = np.arange(BINS)
+        r = (codes >> (2 * BITS)) >> shift
+        g = ((codes >> BITS) & ((1 << BITS) - 1)) >> shift
+        b = (codes & ((1 << BITS) - 1)) >> shift
+        coarse = (r << (2 * SIGNATURE_BITS)) | (g << SIGNATURE_BITS) | b
+        signature = np.bincount(coarse, weights=self.counts, minlength=1 << (3 * SIGNATURE_BITS))
+        return signature / max(1, signature.sum())
+
+    def palette(self, colors=256):
+        """Median cut of the histogram: an (n, 3) uint8 array with n <= colors"""
+        used = np.flatnonzero(self.counts)
+        if len(used) == 0:
+            return np.zeros((1, 3), dtype=np.uint8)
+        weights = self.counts[used].astype(np.float64)
+        means = self.sums[used] / weights[:, None]
+
+        def score(box):
+            # Split the box that holds the most pixels spread over the widest range
+            if len(box) < 2:
+                return 0.0
+            spread = np.ptp(means[box], axis=0).max()
+            return spread * weights[box].sum()
+
+        boxes = [np.arange(len(used))]
+        scores = [score(boxes[0])]
+        while len(boxes) < colors:
+            target = int(np.argmax(scores))
+            if scores[target] <= 0:
+                break
+            box = boxes.pop(target)
+            scores.pop(target)
+
+            channel = int(np.argmax(np.ptp(means[box], axis=0)))
+            box = box[np.argsort(means[box, channel], kind="stable")]
+            cumulative = np.cumsum(weights[box])
+            split = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+            split = min(max(split, 1), len(box) - 1)
+
+            for half in (box[:split], box[split:]):
+                boxes.append(half)
+                scores.append(score(half))
+
+        palette = [np.average(means[box], axis=0, weights=weights[box]) for box in boxes]
+        return np.clip(np.rint(palette), 0, 255).astype(np.uint8)
+
+
+def palette_lut(palette):
+    """Map every histogram bin to its nearest palette entry (uint8 lookup table)"""
+    codes = np.arange(BINS)
+    mask = (1 << BITS) - 1
+    centres = np.stack([codes >> (2 * BITS), (codes >> BITS) & mask, codes & mask], axis=1)
+    centres = (centres << SHIFT) + (1 << SHIFT) // 2
+    # Bins whose top value is 255 map to it exactly, so pure white/black survive
+    centres = np.where(centres >= 255 - (1 << SHIFT) // 2, 255, centres)
+    centres = np.where(centres < (1 << SHIFT), 0, centres).astype(np.int32)
+
+    palette = palette.astype(np.int32)
+    lut = np.empty(BINS, dtype=np.uint8)
+    # Chunked to keep the (bins x colors) distance matrix small
+    for start in range(0, BINS, 1024):
+        diff = centres[start:start + 1024, None, :] - palette[None, :, :]
+        lut[start:start + 1024] = np.argmin((diff * diff).sum(axis=2), axis=1)
+    return lut
+
+
+def apply_palette(rgb, lut):
+    """Palette indices of an (h, w, 3) uint8 frame"""
+    return lut[color_codes(rgb)]
+
+
+class PaletteCache:
+    """Recently built global palettes, reused for inputs with a similar color histogram.
+
+    Converting a batch of clips from the same source (a sticker pack, scenes
+    of one video) then gives them identical palettes and skips the median cut.
+    """
+
+    def __init__(self, cache_file=None, max_entries=64):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def find(self, signature, similarity=REUSE_SIMILARITY):
+        """Cached palette of the most similar input, or None if none is close enough"""
+        with self._lock:
+            self._load()
+            best, best_score = None, similarity
+            for entry in self._entries:
+                score = np.minimum(signature, entry['signature']).sum()
+                if score >= best_score:
+                    best, best_score = entry, score
+        if best is None:
+            return None
+        return np.frombuffer(bytes.fromhex(best['palette']), dtype=np.uint8).reshape(-1, 3)
+
+    def add(self, signature, palette):
+        """Remember a palette and write the cache file"""
+        with self._lock:
+            self._load()
+            self._entries.append({
+                'signature': np.round(signature, 5),
+                'palette': palette.tobytes().hex(),
+            })
+            del self._entries[:-self.max_entries]
+            self._save()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = []
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            self._entries = [{'signature': np.asarray(e['signature'], dtype=np.float64),
+                              'palette': e['palette']} for e in entries]
+        except (OSError, ValueError, KeyError, TypeError):
+            # A corrupt cache is just a cold cache
+            self._entries = []
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump([{'signature': e['signature'].tolist(), 'palette': e['palette']}
+                           for e in self._entries], f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            pass
@@ -0,0 +1,114 @@
+import os
+import shutil
+import time
+
+from output_conflicts import numbered_path
+
+# Seconds a new file's size and modification time must stay the same before
+# it is taken for converting; a copy still in progress keeps changing them
+STABLE_SECONDS = 10.0
+
+# Seconds between two polls of the watched folders
+POLL_INTERVAL = 2.0
+
+# A folder whose own modification time hasn't changed is not listed again,
+# except this often in case the file system's timestamps are too coarse
+FULL_SCAN_INTERVAL = 60.0
+
+# Sub-folder of a watched folder its converted inputs are moved to
+DONE_FOLDER = "done"
+
+
+class FolderWatcher:
+    """Finds files dropped into watched folders once they are completely written.
+
+    poll() keeps a snapshot of every folder: a folder is listed with
+    os.scandir only when its modification time changed (a file was added,
+    removed or renamed), and only the files still being written are stat'ed
+    on every poll, so idle folders cost one stat each. Files already in a
+    folder when watching starts are picked up too. Sub-folders (such as the
+    done folder) and hidden files are ignored.
+    """
+
+    def __init__(self, folders, extensions, stable_seconds=STABLE_SECONDS):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.extensions = {ext.lower() for ext in extensions}
+        self.stable_seconds = stable_seconds
+        self._folder_times = {}  # folder -> st_mtime_ns when it was last listed
+        self._last_full_scan = 0.0
+        self._pending = {}  # file -> (size, mtime_ns, time it last changed)
+        self._handed_out = {}  # file -> (size, mtime_ns) when poll returned it
+
+    def poll(self, now=None):
+        """Files that became stable since the last poll"""
+        now = time.monotonic() if now is None else now
+        full_scan = now - self._last_full_scan >= FULL_SCAN_INTERVAL
+        if full_scan:
+            self._last_full_scan = now
+        for folder in self.folders:
+            try:
+                folder_time = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            if full_scan or self._folder_times.get(folder) != folder_time:
+                self._folder_times[folder] = folder_time
+                self._scan(folder, now)
+
+        ready = []
+        for path, (size, mtime, changed_at) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]  # moved away or deleted before it settled
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                self._pending[path] = (st.st_size, st.st_mtime_ns, now)
+            elif now - changed_at >= self.stable_seconds:
+                del self._pending[path]
+                self._handed_out[path] = (size, mtime)
+                ready.append(path)
+        return sorted(ready)
+
+    def retry(self, paths, now=None):
+        """Take files poll() returned back, so they are returned again once stable"""
+        now = time.monotonic() if now is None else now
+        for path in paths:
+            size, mtime = self._handed_out.pop(path, (None, None))
+            if size is not None:
+                self._pending[path] = (size, mtime, now)
+
+    def _scan(self, folder, now):
+        present = set()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in self.extensions:
+                        continue
+                    path = entry.path
+                    present.add(path)
+                    if path in self._pending:
+                        continue
+                    st = entry.stat()
+                    # A file handed out before is new again only if it was replaced
+                    if self._handed_out.get(path) == (st.st_size, st.st_mtime_ns):
+                        continue
+                    self._pending[path] = (st.st_size, st.st_mtime_ns, now)
+        except OSError:
+            return
+        for path in [p for p in self._handed_out if os.path.dirname(p) == folder and p not in present]:
+            del self._handed_out[path]
+
+
+def move_to_done(input_path, done_folder=None):
+    """Move a converted input into done_folder (default: the done folder next to it); returns the new path"""
+    done_folder = done_folder or os.path.join(os.path.dirname(input_path), DONE_FOLDER)
+    os.makedirs(done_folder, exist_ok=True)
+    target = os.path.join(done_folder, os.path.basename(input_path))
+    number = 1
+    while os.path.exists(target):
+        target = numbered_path(os.path.join(done_folder, os.path.basename(input_path)), number)
+        number += 1
+    shutil.move(input_path, target)
+    return target
@@ -0,0 +1,122 @@
+import csv
+import json
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Resource usage of the jobs of a batch: the wall time, CPU seconds and peak
+# memory every job cost (see Job.add_usage), written as a CSV/JSON report
+# per batch and summed up by preset and by input to show what dominates
+# machine time.
+
+REPORT_FIELDS = ("input", "preset", "status", "outputs", "wall_s", "cpu_user_s", "cpu_system_s", "peak_rss_mb",
+                 "worker", "ffmpeg_processes", "fps", "speed", "input_bytes", "output_bytes")
+
+# Inputs listed in the summary, most CPU first
+SUMMARY_TOP_INPUTS = 3
+
+
+def thread_cpu_times():
+    """(user, system) CPU seconds of the calling thread; system is 0 where only the total is known"""
+    if resource is not None and hasattr(resource, 'RUSAGE_THREAD'):
+        usage = resource.getrusage(resource.RUSAGE_THREAD)
+        return usage.ru_utime, usage.ru_stime
+    return time.thread_time(), 0.0
+
+
+def job_record(job):
+    """One report row of a finished job"""
+    def rounded(value, digits=3):
+        return round(value, digits) if value is not None else None
+
+    return {
+        "input": job.input_path,
+        "preset": job.preset,
+        "status": job.status,
+        "outputs": job.outputs,
+        "wall_s": rounded(job.elapsed),
+        "cpu_user_s": rounded(job.cpu_user),
+        "cpu_system_s": rounded(job.cpu_system),
+        "peak_rss_mb": rounded(job.peak_rss / (1024 * 1024), 1) if job.peak_rss else None,
+        # In-process jobs (WebP) share the app's memory, so they have no peak of their own
+        "worker": "ffmpeg" if job.ffmpeg_processes else "app",
+        "ffmpeg_processes": job.ffmpeg_processes,
+        "fps": job.fps,
+        "speed": job.speed,
+        "input_bytes": job.input_bytes,
+        "output_bytes": job.output_bytes,
+    }
+
+
+def summarize(records):
+    """Batch totals, CPU per preset and the inputs that cost the most CPU"""
+    def cpu(record):
+        return (record["cpu_user_s"] or 0) + (record["cpu_system_s"] or 0)
+
+    presets = {}
+    for record in records:
+        entry = presets.setdefault(record["preset"], {"jobs": 0, "wall_s": 0.0, "cpu_s": 0.0})
+        entry["jobs"] += 1
+        entry["wall_s"] += record["wall_s"] or 0
+        entry["cpu_s"] += cpu(record)
+    peaks = [record["peak_rss_mb"] for record in records if record["peak_rss_mb"] is not None]
+    return {
+        "jobs": len(records),
+        "failed": sum(1 for record in records if record["status"] == "failed"),
+        "wall_s": sum(record["wall_s"] or 0 for record in records),
+        "cpu_s": sum(cpu(record) for record in records),
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "input_bytes": sum(record["input_bytes"] or 0 for record in records),
+        "output_bytes": sum(record["output_bytes"] or 0 for record in records),
+        "presets": dict(sorted(presets.items(), key=lambda item: -item[1]["cpu_s"])),
+        "top_inputs": [{"input": record["input"], "cpu_s": cpu(record)}
+                       for record in sorted(records, key=cpu, reverse=True)[:SUMMARY_TOP_INPUTS]],
+    }
+
+
+def format_seconds(seconds):
+    """Short duration: 4.2s, 3m 07s, 1h 05m"""
+    if seconds < 10:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def format_summary(summary):
+    """A few human readable lines for the log and the GUI summary panel"""
+    peak = f", peak {summary['peak_rss_mb']:.0f} MB" if summary["peak_rss_mb"] is not None else ""
+    lines = [
+        f"{summary['jobs']} job(s): {format_seconds(summary['wall_s'])} job time, "
+        f"{format_seconds(summary['cpu_s'])} CPU{peak}, "
+        f"{summary['input_bytes'] / 1e6:.1f} MB in, {summary['output_bytes'] / 1e6:.1f} MB out",
+        "CPU by preset: " + ", ".join(f"{key} {format_seconds(entry['cpu_s'])} ({entry['jobs']})"
+                                      for key, entry in summary["presets"].items()),
+        "Most CPU: " + ", ".join(f"{os.path.basename(entry['input'])} {format_seconds(entry['cpu_s'])}"
+                                 for entry in summary["top_inputs"]),
+    ]
+    return "\n".join(lines)
+
+
+def write_report(records, folder):
+    """Write records as alchemist-report-<time>.csv and .json into folder; returns the two paths"""
+    base = os.path.join(folder, time.strftime("alchemist-report-%Y%m%d-%H%M%S"))
+    csv_path, number = base + ".csv", 1
+    while os.path.exists(csv_path):  # batches finishing within the same second
+        number += 1
+        csv_path = f"{base}-{number}.csv"
+    json_path = os.path.splitext(csv_path)[0] + ".json"
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow({**record, "outputs": ";".join(record["outputs"])})
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({"summary": summarize(records), "jobs": records}, f, indent=1)
+    return csv_path, json_path
@@ -0,0 +1,81 @@
+import os
+
+# What a batch does with an output file that already exists:
+#   skip:          leave the existing file, don't convert the input
+#   overwrite:     convert and replace it
+#   rename:        convert to a free name ("clip (1).mp4")
+#   skip-if-newer: skip when the existing file is newer than the input,
+#                  i.e. the input hasn't changed since it was converted
+CONFLICT_POLICIES = ("skip", "overwrite", "rename", "skip-if-newer")
+
+
+def numbered_path(path, number):
+    """path with ' (number)' added before the extension"""
+    base, ext = os.path.splitext(path)
+    return f"{base} ({number}){ext}"
+
+
+class OutputConflicts:
+    """The policy for existing outputs, applied to a batch while its jobs are built.
+
+    Each output folder is listed once, up front, instead of checking every
+    output on its own, and outputs claimed by earlier jobs of the same batch
+    count as existing, so two inputs never write to the same file.
+    """
+
+    def __init__(self, policy="skip"):
+        if policy not in CONFLICT_POLICIES:
+            raise ValueError(f"unknown conflict policy {policy!r}")
+        self.policy = policy
+        self._folders = {}  # folder -> {normalized file name: modification time}
+        self._claimed = set()
+
+    def _key(self, path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _listing(self, folder):
+        if folder not in self._folders:
+            listing = {}
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        # Hidden files are our partial outputs and journals
+                        if not entry.name.startswith('.') and entry.is_file():
+                            listing[os.path.normcase(entry.name)] = entry.stat().st_mtime
+            except OSError:
+                pass
+            self._folders[folder] = listing
+        return self._folders[folder]
+
+    def modified_time(self, path):
+        """Modification time of an existing output, infinity for one claimed by this batch, None if free"""
+        key = self._key(path)
+        if key in self._claimed:
+            return float('inf')
+        folder, name = os.path.split(key)
+        return self._listing(folder).get(name)
+
+    def resolve(self, input_path, outputs):
+        """Apply the policy to a job's outputs.
+
+        Returns (outputs to write or None to skip the job, the outputs that
+        already existed).
+        """
+        conflicts = [path for path in outputs if self.modified_time(path) is not None]
+        if conflicts and self.policy == "skip":
+            return None, conflicts
+        if conflicts and self.policy == "skip-if-newer":
+            try:
+                input_time = os.path.getmtime(input_path)
+            except OSError:
+                input_time = float('inf')
+            if all(self.modified_time(path) >= input_time for path in conflicts):
+                return None, conflicts
+        if conflicts and self.policy == "rename":
+            number = 1
+            while any(self.modified_time(numbered_path(path, number)) is not None for path in outputs):
+                number += 1
+            outputs = [numbered_path(path, number) for path in outputs]
+
+        self._claimed.update(self._key(path) for path in outputs)
+        return outputs, conflicts
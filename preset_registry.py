@@ -0,0 +1,153 @@
+import copy
+import json
+import os
+from collections import namedtuple
+
+# Conversion presets are described in presets.json (shipped next to the app)
+# and optionally tuned or extended by a presets.json in the user's app data
+# folder. Each entry:
+#   label:             button text
+#   extensions:        input extensions the preset accepts; "@video"/"@audio" stand for the
+#                      built-in groups
+#   suffix:            appended to the input base name; "@audio-codec" picks the extension of
+#                      the chosen audio track's codec per file
+#   skip_extensions:   accepted extensions that are left alone (MP3 inputs of the MP3 preset)
+#   method:            Converter method converting a single Job
+#   description:       batch name used in status/log messages
+#   verb:              past tense used in the summary ("converted", "extracted")
+#   needs_ffmpeg:      whether the preset shells out to FFmpeg
+#   needs_audio_track: whether an audio track has to be chosen per file
+#   video, audio:      encoder settings: {"codec": name, "<ffmpeg option>": value, ...}
+#   video_filter:      filter chain applied before the video encoder
+#   output_args:       extra FFmpeg arguments for the output file (container flags)
+#   threads:           encoder threads (-threads), null = FFmpeg's default
+#   qualities:         named variants merged over "video" (XviD quality levels, WebM speed tiers)
+#   targets:           fan-out target -> preset whose encoder settings it reuses; a preset
+#                      with targets writes one output per target
+#
+# A user entry with the key of a built-in preset changes only the fields it
+# lists (video/audio options are merged one by one); a new key can name a
+# "base" preset to start from, e.g. a faster variant of a built-in one.
+
+REQUIRED_FIELDS = ("label", "extensions", "suffix", "method", "description")
+
+# Suffixes decided per file rather than fixed by the preset
+DERIVED_SUFFIXES = ("@audio-codec",)
+
+PRESET_DEFAULTS = {
+    "verb": "converted",
+    "needs_ffmpeg": True,
+    "needs_audio_track": False,
+    "skip_extensions": [],
+    "video": None,
+    "audio": None,
+    "video_filter": None,
+    "output_args": [],
+    "threads": None,
+    "qualities": {},
+    "targets": {},
+}
+
+# Encoder settings merged option by option when a user entry tunes them
+MERGED_FIELDS = ("video", "audio", "qualities", "targets")
+
+
+def codec_args(settings, stream):
+    """FFmpeg arguments for encoder settings: -c:<stream> codec followed by -option value pairs"""
+    if not settings:
+        return []
+    args = [f"-c:{stream}", str(settings["codec"])]
+    for option, value in settings.items():
+        if option != "codec":
+            args += [f"-{option}", str(value)]
+    return args
+
+
+class Preset(namedtuple("Preset", REQUIRED_FIELDS + tuple(PRESET_DEFAULTS))):
+    """A conversion preset, shared by the GUI buttons and the command line"""
+
+    __slots__ = ()
+
+    def video_args(self, quality=None):
+        """Video encoder arguments, with a named quality variant applied if there is one"""
+        settings = dict(self.video or {})
+        settings.update(self.qualities.get(quality, {}).get("video", {}))
+        args = codec_args(settings, "v")
+        if args and self.threads is not None:
+            args += ["-threads", str(self.threads)]
+        return args
+
+    def audio_args(self):
+        """Audio encoder arguments"""
+        return codec_args(self.audio, "a")
+
+
+def merge_entry(base, changes):
+    """A preset entry with changes applied over base"""
+    entry = copy.deepcopy(base)
+    for field, value in changes.items():
+        if field in MERGED_FIELDS and isinstance(value, dict) and isinstance(entry.get(field), dict):
+            entry[field].update(value)
+        else:
+            entry[field] = value
+    return entry
+
+
+def read_entries(path):
+    """Preset entries of a presets.json file, keyed on preset name"""
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, dict) or not all(isinstance(e, dict) for e in entries.values()):
+        raise ValueError(f"{path}: expected an object of preset objects")
+    return entries
+
+
+def build_preset(key, entry, extension_groups):
+    """Turn one validated entry into a Preset"""
+    missing = [field for field in REQUIRED_FIELDS if field not in entry]
+    if missing:
+        raise ValueError(f"preset {key!r} lacks {', '.join(missing)}")
+    unknown = set(entry) - set(Preset._fields) - {"base"}
+    if unknown:
+        raise ValueError(f"preset {key!r} has unknown fields {', '.join(sorted(unknown))}")
+
+    extensions = set()
+    for extension in entry["extensions"]:
+        if extension.startswith("@"):
+            if extension[1:] not in extension_groups:
+                raise ValueError(f"preset {key!r}: unknown extension group {extension}")
+            extensions |= extension_groups[extension[1:]]
+        else:
+            extensions.add(extension.lower())
+
+    suffix = entry["suffix"]
+    if not isinstance(suffix, str) or (suffix.startswith("@") and suffix not in DERIVED_SUFFIXES):
+        raise ValueError(f"preset {key!r}: suffix must be a file name ending or one of {', '.join(DERIVED_SUFFIXES)}")
+
+    skip_extensions = {extension.lower() for extension in entry.get("skip_extensions", [])}
+    fields = {**copy.deepcopy(PRESET_DEFAULTS), **entry, "extensions": extensions,
+              "skip_extensions": skip_extensions}
+    fields.pop("base", None)
+    for stream in ("video", "audio"):
+        if fields[stream] is not None and "codec" not in fields[stream]:
+            raise ValueError(f"preset {key!r}: {stream} settings need a codec")
+    return Preset(**fields)
+
+
+def load_presets(path, extension_groups, user_path=None):
+    """Load the presets of path, tuned/extended by user_path if it exists.
+
+    Raises OSError or ValueError for a missing or invalid file.
+    """
+    entries = read_entries(path)
+    if user_path and os.path.exists(user_path):
+        for key, changes in read_entries(user_path).items():
+            base_key = changes.get("base", key)
+            if base_key in entries:
+                entries[key] = merge_entry(entries[base_key], changes)
+            elif "base" in changes:
+                raise ValueError(f"{user_path}: preset {key!r} is based on unknown preset {base_key!r}")
+            else:
+                entries[key] = changes
+
+    return {key: build_preset(key, entry, extension_groups) for key, entry in entries.items()}
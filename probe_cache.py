@@ -0,0 +1,162 @@
+import json
+import os
+import subprocess
+import threading
+import time
+
+# Packets read from the start of the file to find each stream's first timestamp.
+# Enough to see the first packet of every track in interleaved MKV/MP4 files
+# without reading the whole container.
+FIRST_PACKETS = 400
+
+# Minimum seconds between two writes of the cache file while probing a batch
+SAVE_INTERVAL = 5.0
+
+
+def file_key(input_path):
+    """Identity of a file: absolute path, size and modification time.
+
+    A file edited or replaced since gets a new key. Shared by the probe
+    cache and the batch journal, so both notice the same changes.
+    """
+    st = os.stat(input_path)
+    return f"{os.path.abspath(input_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+class ProbeCache:
+    """One ffprobe run per file, cached in memory and on disk.
+
+    Each entry holds ffprobe's -show_streams/-show_format output plus the
+    first packet timestamp of every stream, keyed on path + size + mtime so
+    an edited or replaced file is probed again. Files ffprobe can't read are
+    remembered in memory only: the error is raised again without a new run
+    until the file changes or the app restarts.
+    """
+
+    def __init__(self, ffprobe_path, cache_file=None, max_entries=2000):
+        self.ffprobe_path = ffprobe_path
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self._entries = None
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        self._running = {}  # key -> Event set when the ffprobe run for that file ends
+        self._failures = {}  # key -> error message of a failed ffprobe run
+
+    def get(self, input_path):
+        """Return probe data for a file, running ffprobe only on a cache miss.
+
+        Callers asking for a file that is being probed on another thread wait
+        for that result instead of starting a second ffprobe.
+        """
+        key = file_key(input_path)
+        while True:
+            with self._lock:
+                self._load()
+                info = self._entries.get(key)
+                if info is not None:
+                    return info
+                failure = self._failures.get(key)
+                if failure is not None:
+                    raise RuntimeError(failure)
+                running = self._running.get(key)
+                if running is None:
+                    running = self._running[key] = threading.Event()
+                    break
+            running.wait()
+
+        try:
+            try:
+                info = self._run_ffprobe(input_path)
+            except Exception as e:
+                with self._lock:
+                    self._failures[key] = str(e) or type(e).__name__
+                    while len(self._failures) > self.max_entries:
+                        del self._failures[next(iter(self._failures))]
+                raise
+            with self._lock:
+                self._entries[key] = info
+                # Oldest entries go first once the cache is full (dicts keep insertion order)
+                while len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+                self._dirty = True
+                if time.time() - self._last_save >= SAVE_INTERVAL:
+                    self._save()
+        finally:
+            with self._lock:
+                del self._running[key]
+            running.set()
+        return info
+
+    def flush(self):
+        """Write pending entries to disk (called at the end of a batch)"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def streams(self, input_path, codec_type=None):
+        """Streams of a file, optionally only those of one codec_type ('video', 'audio', ...)"""
+        streams = self.get(input_path).get('streams', [])
+        if codec_type is None:
+            return streams
+        return [s for s in streams if s.get('codec_type') == codec_type]
+
+    def first_pts(self, input_path, stream_index):
+        """First packet timestamp (seconds) of a stream, or None if none was seen"""
+        return self.get(input_path).get('first_pts', {}).get(str(stream_index))
+
+    def _run_ffprobe(self, input_path):
+        result = subprocess.run(
+            [self.ffprobe_path, '-v', 'error',
+             '-show_streams', '-show_format',
+             '-show_entries', 'packet=stream_index,pts_time',
+             '-read_intervals', f'%+#{FIRST_PACKETS}',
+             '-of', 'json', input_path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=60
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"ffprobe exited with code {result.returncode}")
+
+        data = json.loads(result.stdout)
+
+        # Keep only the first timestamp per stream instead of the raw packet list
+        first_pts = {}
+        for packet in data.get('packets', []):
+            index = str(packet.get('stream_index'))
+            pts_time = packet.get('pts_time')
+            if index not in first_pts and pts_time not in (None, 'N/A'):
+                first_pts[index] = float(pts_time)
+
+        return {
+            'streams': data.get('streams', []),
+            'format': data.get('format', {}),
+            'first_pts': first_pts,
+        }
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            # A corrupt cache is just a cold cache
+            self._entries = {}
+
+    def _save(self):
+        self._dirty = False
+        self._last_save = time.time()
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            pass
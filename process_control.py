@@ -0,0 +1,147 @@
+import os
+import signal
+import subprocess
+import sys
+
+# Pausing, resuming and killing running FFmpeg processes, and measuring the
+# CPU time and memory they used.
+#
+# Commands are argument lists started without a shell, so the Popen handle
+# is FFmpeg itself. On POSIX it also runs in a session of its own, so a
+# signal sent to its process group reaches any helper it spawns.
+
+if os.name == 'nt':
+    import ctypes
+    from ctypes import wintypes
+
+    PROCESS_SUSPEND_RESUME = 0x0800
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+    def _nt_usage(handle):
+        """CPU seconds and peak working set of a process handle (valid after the process exited)"""
+        kernel32 = ctypes.windll.kernel32
+        creation, exit_time, kernel, user = (ctypes.c_ulonglong() for _ in range(4))
+        if not kernel32.GetProcessTimes(handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                                        ctypes.byref(kernel), ctypes.byref(user)):
+            return {}
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        peak = None
+        if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            peak = counters.PeakWorkingSetSize
+        # FILETIME counts 100 ns units
+        return {'user': user.value / 1e7, 'system': kernel.value / 1e7, 'peak_rss': peak}
+
+    def _nt_suspend_resume(process, function):
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_SUSPEND_RESUME, False, process.pid)
+        if not handle:
+            return False
+        try:
+            return getattr(ctypes.windll.ntdll, function)(handle) == 0
+        finally:
+            kernel32.CloseHandle(handle)
+
+
+def popen_options():
+    """Popen keyword arguments that make a process controllable by this module"""
+    if os.name == 'nt':
+        return {}
+    return {'start_new_session': True}
+
+
+def maxrss_bytes(maxrss):
+    """ru_maxrss in bytes: it is kilobytes on Linux but bytes on macOS"""
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def wait_for_exit(process):
+    """Wait for a process to end and return what it used: {'user', 'system', 'peak_rss'}.
+
+    CPU times are seconds, peak_rss is bytes. Returns {} if the usage is
+    unknown, e.g. when kill_process reaped the process first.
+    """
+    if os.name == 'nt':
+        process.wait()
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, process.pid)
+        if not handle:
+            return {}
+        try:
+            return _nt_usage(handle)
+        finally:
+            kernel32.CloseHandle(handle)
+    # wait4 is the only way to get the child's own usage, but it reaps the child,
+    # so it runs under Popen's lock: poll()/wait() from pause, resume or stop on
+    # other threads then see the returncode set here instead of mistaking the
+    # lost child for a clean exit (CPython reads ECHILD as return code 0). The
+    # lock is a CPython detail; without it, let Popen reap and skip the metrics
+    lock = getattr(process, '_waitpid_lock', None)
+    if lock is None:
+        process.wait()
+        return {}
+    # Wait for the exit without reaping it, so the lock isn't held meanwhile
+    if hasattr(os, 'waitid'):  # elsewhere the lock is held for the whole wait, which is safe too
+        try:
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        except ChildProcessError:
+            pass
+    with lock:
+        if process.returncode is not None:
+            return {}  # already reaped through the Popen, e.g. by kill_process
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            process.returncode = -1  # reaped behind Popen's back: the exit status is lost, count it as failed
+            return {}
+        process.returncode = os.waitstatus_to_exitcode(status)
+    return {'user': usage.ru_utime, 'system': usage.ru_stime, 'peak_rss': maxrss_bytes(usage.ru_maxrss)}
+
+
+def suspend_process(process):
+    """Freeze a running process without losing its work"""
+    if process.poll() is not None:
+        return False
+    if os.name == 'nt':
+        return _nt_suspend_resume(process, 'NtSuspendProcess')
+    try:
+        os.killpg(process.pid, signal.SIGSTOP)
+        return True
+    except OSError:
+        return False
+
+
+def resume_process(process):
+    """Let a suspended process continue"""
+    if process.poll() is not None:
+        return False
+    if os.name == 'nt':
+        return _nt_suspend_resume(process, 'NtResumeProcess')
+    try:
+        os.killpg(process.pid, signal.SIGCONT)
+        return True
+    except OSError:
+        return False
+
+
+def kill_process(process):
+    """Kill a process at once, even while it is suspended"""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == 'nt':
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
@@ -0,0 +1,277 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from job_metrics import thread_cpu_times
+from process_control import kill_process, resume_process, suspend_process
+
+
+def default_worker_count():
+    """Return a sensible number of parallel jobs for this machine"""
+    # FFmpeg encoders are multithreaded themselves, so running one job per
+    # core would oversubscribe the CPU. Half the cores keeps every core busy
+    # while leaving room for the encoder's own threads.
+    cores = os.cpu_count() or 2
+    return max(1, cores // 2)
+
+
+class Job:
+    """A single conversion: one input file turned into one (or more) output files"""
+
+    def __init__(self, input_path, output_path, work, description=None, extra_outputs=None, preset=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.extra_outputs = list(extra_outputs or [])  # written by the same job, e.g. a fan-out
+        self.temp_outputs = None  # where the work writes outputs while they are unfinished, see write_paths
+        self.work = work  # callable(job) -> bool
+        self.preset = preset  # key of the preset whose settings the work uses
+        self.description = description or os.path.basename(input_path)
+        self.status = "pending"  # pending, running, done, failed, cancelled
+        self.progress = 0.0
+        self.fps = None    # encoder frames per second, when reported
+        self.speed = None  # encoding speed as a multiple of realtime, when reported
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        # Resources used, see add_usage; sizes are recorded when the job starts/ends
+        self.cpu_user = 0.0   # seconds, the worker thread plus every FFmpeg process
+        self.cpu_system = 0.0
+        self.peak_rss = None  # bytes, the largest FFmpeg process; None for in-process jobs
+        self.ffmpeg_processes = 0
+        self.input_bytes = None
+        self.output_bytes = None
+        self._usage_lock = threading.Lock()
+
+    @property
+    def outputs(self):
+        """Every file this job writes, main output first"""
+        return [self.output_path] + self.extra_outputs
+
+    @property
+    def write_paths(self):
+        """The files the work writes, in the order of outputs: temporary names if set"""
+        return self.temp_outputs or self.outputs
+
+    @property
+    def write_path(self):
+        """The file the work writes the main output to"""
+        return self.write_paths[0]
+
+    def add_usage(self, user, system, peak_rss=None, process=False):
+        """Charge CPU seconds and peak memory to this job (callable from several threads)"""
+        with self._usage_lock:
+            self.cpu_user += user
+            self.cpu_system += system
+            if peak_rss is not None:
+                self.peak_rss = max(self.peak_rss or 0, peak_rss)
+            if process:
+                self.ffmpeg_processes += 1
+
+    @property
+    def elapsed(self):
+        """Seconds spent running this job so far"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class JobScheduler:
+    """Run conversion jobs on a shared pool of worker threads.
+
+    Every conversion command builds a list of Job objects and hands it to
+    run(). The scheduler keeps per-job progress, success/failure counts and
+    the pause/stop state that workers check between (and inside) jobs.
+    Running FFmpeg processes are registered with it too, so pausing
+    suspends them and stopping kills them right away.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or default_worker_count()
+        self.jobs = []
+        self.successful = 0
+        self.failed = 0
+        self.running = False
+
+        # Callbacks, invoked from worker threads
+        self.on_job_started = None   # callable(job)
+        self.on_job_finished = None  # callable(job)
+        self.on_job_progress = None  # callable(job), in-file progress/fps/speed changed
+        self.on_progress = None      # callable(fraction of the whole batch, 0..1)
+
+        self._lock = threading.Lock()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._stop_event = threading.Event()
+        self._processes = set()
+
+    @property
+    def paused(self):
+        return not self._resume_event.is_set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def pause(self):
+        """Hold workers before their next job (and inside frame loops) and suspend running processes"""
+        with self._lock:
+            self._resume_event.clear()
+            for process in self._processes:
+                suspend_process(process)
+
+    def resume(self):
+        """Let paused workers and suspended processes continue"""
+        with self._lock:
+            self._resume_event.set()
+            for process in self._processes:
+                resume_process(process)
+
+    def stop(self):
+        """Cancel all pending jobs and kill running processes; their jobs end as cancelled"""
+        with self._lock:
+            self._stop_event.set()
+            self._resume_event.set()  # wake paused workers so they can exit
+            processes = list(self._processes)
+        for process in processes:
+            kill_process(process)
+
+    def add_process(self, process):
+        """Track a child process until remove_process; it follows pause/stop from now on"""
+        with self._lock:
+            self._processes.add(process)
+            if self.paused:
+                suspend_process(process)
+            stopped = self.stopped
+        if stopped:
+            kill_process(process)
+
+    def remove_process(self, process):
+        """Stop tracking a child process that has exited"""
+        with self._lock:
+            self._processes.discard(process)
+
+    def reset(self):
+        """Clear pause/stop state before a new batch"""
+        self._stop_event.clear()
+        self._resume_event.set()
+
+    def wait_while_paused(self):
+        """Block while paused. Returns False if the batch was stopped."""
+        self._resume_event.wait()  # stop() sets it too, so a stopped batch never blocks here
+        return not self.stopped
+
+    def set_job_progress(self, job, fraction):
+        """Record in-file progress for a job and report the batch total"""
+        job.progress = max(0.0, min(1.0, fraction))
+        if self.on_job_progress:
+            self.on_job_progress(job)
+        self._report_progress()
+
+    def overall_progress(self):
+        """Fraction of the batch finished, counting partial progress of running jobs"""
+        if not self.jobs:
+            return 1.0
+        return sum(job.progress for job in self.jobs) / len(self.jobs)
+
+    def run(self, jobs):
+        """Run all jobs and block until they finish or the batch is stopped.
+
+        Returns a (successful, failed) tuple.
+        """
+        self.jobs = list(jobs)
+        self.successful = 0
+        self.failed = 0
+        if not self.jobs:
+            return 0, 0
+
+        self.running = True
+        try:
+            workers = max(1, min(self.max_workers, len(self.jobs)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alchemist-job") as pool:
+                futures = [pool.submit(self._run_job, job) for job in self.jobs]
+                wait(futures)
+        finally:
+            self.running = False
+        return self.successful, self.failed
+
+    def run_incremental(self, next_jobs, interval, on_error=None):
+        """Keep running the jobs next_jobs() returns until the batch is stopped.
+
+        next_jobs is called every interval seconds, also while jobs are
+        running or paused, so new work is queued as soon as it appears.
+        If it raises, on_error(exception) is told and the next poll goes on
+        as usual. Finished jobs are dropped from self.jobs as new ones come in.
+        Returns a (successful, failed) tuple.
+        """
+        self.jobs = []
+        self.successful = 0
+        self.failed = 0
+        self.running = True
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="alchemist-job") as pool:
+                while not self.stopped:
+                    try:
+                        jobs = next_jobs()
+                    except Exception as e:
+                        jobs = []
+                        if on_error:
+                            on_error(e)
+                    if jobs:
+                        with self._lock:
+                            self.jobs = [job for job in self.jobs if job.status in ("pending", "running")] + jobs
+                        for job in jobs:
+                            pool.submit(self._run_job, job)
+                    self._stop_event.wait(interval)
+        finally:
+            self.running = False
+        return self.successful, self.failed
+
+    def _run_job(self, job):
+        if not self.wait_while_paused():
+            job.status = "cancelled"
+            return
+
+        job.status = "running"
+        job.started_at = time.time()
+        if self.on_job_started:
+            self.on_job_started(job)
+
+        try:
+            job.input_bytes = os.path.getsize(job.input_path)  # before the work may move the input
+        except OSError:
+            pass
+        cpu_before = thread_cpu_times()
+        try:
+            ok = bool(job.work(job))
+        except Exception as e:
+            job.error = str(e)
+            ok = False
+        job.finished_at = time.time()
+        self._record_usage(job, cpu_before)
+
+        with self._lock:
+            if ok:
+                job.status = "done"
+                self.successful += 1
+            elif self.stopped:
+                job.status = "cancelled"
+            else:
+                job.status = "failed"
+                self.failed += 1
+        job.progress = 1.0
+
+        if self.on_job_finished:
+            self.on_job_finished(job)
+        self._report_progress()
+
+    def _record_usage(self, job, cpu_before):
+        """Add the worker thread's CPU time and the output size to a finished job"""
+        user, system = (after - before for after, before in zip(thread_cpu_times(), cpu_before))
+        # No peak memory: the worker thread's can't be told apart from the app's and the other jobs'
+        job.add_usage(user, system)
+        job.output_bytes = sum(os.path.getsize(path) for path in job.outputs if os.path.exists(path))
+
+    def _report_progress(self):
+        if self.on_progress:
+            self.on_progress(self.overall_progress())
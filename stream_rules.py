@@ -0,0 +1,65 @@
+import operator
+
+# What each output target accepts without re-encoding, per stream type.
+# A probed stream is copied when it meets every constraint of its type and
+# transcoded otherwise; the first constraint it fails is the reason logged.
+#   field: set of accepted values, or (comparison, limit) for numbers
+COPY_RULES = {
+    # H.264/AAC MP4 (WebM to MP4, GIF to MP4, fan-out MP4)
+    "mp4": {
+        "video": {"codec_name": {"h264"}, "pix_fmt": {"yuv420p", "yuvj420p"}},
+        "audio": {"codec_name": {"aac", "mp3"}},
+    },
+    # VP9/Opus WebM (MP4 to WebM, fan-out WebM)
+    "webm": {
+        "video": {"codec_name": {"vp9", "vp8", "av1"}},
+        "audio": {"codec_name": {"opus", "vorbis"}},
+    },
+    # What the PS3 media player decodes in hardware
+    "ps3": {
+        "video": {
+            "codec_name": {"h264"},
+            "pix_fmt": {"yuv420p"},
+            "profile": {"High", "Main", "Baseline", "Constrained Baseline"},
+            "level": ("<=", 41),
+            "width": ("<=", 1920),
+            "height": ("<=", 1080),
+        },
+        "audio": {
+            "codec_name": {"aac"},
+            "profile": {"LC"},
+            "channels": ("<=", 2),
+            "sample_rate": {"44100", "48000"},
+        },
+    },
+    # 320k MP3
+    "mp3": {
+        "audio": {"codec_name": {"mp3"}, "bit_rate": (">=", 320000)},
+    },
+}
+
+COMPARISONS = {"<=": operator.le, ">=": operator.ge}
+
+
+def check_stream(target, stream):
+    """Can this probed stream be copied into target as is? Returns (bool, reason)."""
+    constraints = COPY_RULES.get(target, {}).get(stream.get('codec_type'))
+    if not constraints:
+        return False, f"{target} has no stream copy rule for {stream.get('codec_type')} streams"
+
+    for field, allowed in constraints.items():
+        value = stream.get(field)
+        if value is None:
+            return False, f"{field} unknown"
+        if isinstance(allowed, tuple):
+            comparison, limit = allowed
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return False, f"{field} unknown"
+            if not COMPARISONS[comparison](number, limit):
+                return False, f"{field} {value} is not {comparison} {limit}"
+        elif str(value) not in allowed:
+            return False, f"{field} is {value}, not {'/'.join(sorted(allowed))}"
+
+    return True, f"already {target} compatible"
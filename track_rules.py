@@ -0,0 +1,99 @@
+# Automatic audio track selection for presets that keep one track (PS3,
+# XviD, extract audio, fan-out). Rules are tried in order:
+#   1. a file with a single track needs no choice
+#   2. same_as_previous: the track matching the previous file's choice
+#      (language, codec, channels), for the episodes of a series
+#   3. languages: the first preferred language present narrows the tracks
+#   4. codecs, then channels ("most" or "stereo") rank what is left
+# A file the rules cannot settle is ambiguous and goes to review, with the
+# best guess preselected.
+
+CHANNEL_PREFERENCES = ("any", "most", "stereo")
+
+
+def track_language(stream):
+    """ISO 639-2 language tag of a stream ('eng', 'jpn', ...), lower case, or 'und'"""
+    return stream.get('tags', {}).get('language', 'und').lower()
+
+
+def track_key(stream):
+    """What identifies a track across the episodes of a series"""
+    return track_language(stream), stream.get('codec_name'), stream.get('channels')
+
+
+def track_layout(streams):
+    """The track keys of a whole file; files with equal layouts get the same choice"""
+    return tuple(track_key(stream) for stream in streams)
+
+
+def track_label(index, stream):
+    """Human readable description of the index-th audio track"""
+    tags = stream.get('tags', {})
+    lang = tags.get('language', 'unknown')
+    title = tags.get('title', '')
+    codec = stream.get('codec_name', '?')
+    channels = stream.get('channels', '?')
+    bitrate = stream.get('bit_rate', '')
+    bitrate_str = f", {int(bitrate)//1000}k" if str(bitrate).isdigit() else ''
+    label = f"Track {index+1}: [{lang}] {codec} {channels}ch{bitrate_str}"
+    if title:
+        label += f" — {title}"
+    return label
+
+
+class TrackRules:
+    """Preferences that pick an audio track without asking"""
+
+    def __init__(self, languages=(), codecs=(), channels="any", same_as_previous=True):
+        self.languages = [lang.strip().lower() for lang in languages if lang.strip()]
+        self.codecs = [codec.strip().lower() for codec in codecs if codec.strip()]
+        self.channels = channels
+        self.same_as_previous = same_as_previous
+
+    def select(self, streams, previous=None):
+        """Pick a track. Returns (index or None if ambiguous, best guess, reason).
+
+        previous is the track_key of the track chosen for the previous file.
+        """
+        if len(streams) <= 1:
+            return 0, 0, "single track"
+
+        if self.same_as_previous and previous is not None:
+            matches = [i for i, stream in enumerate(streams) if track_key(stream) == previous]
+            if len(matches) == 1:
+                return matches[0], matches[0], "same as the previous file"
+
+        candidates = list(range(len(streams)))
+        reason = None
+        for language in self.languages:
+            matches = [i for i in candidates if track_language(streams[i]) == language]
+            if matches:
+                candidates, reason = matches, f"language {language}"
+                break
+
+        ranked = sorted(candidates, key=lambda i: self._rank(streams[i]))
+        guess = ranked[0]
+        if self.languages and reason is None:
+            return None, guess, "no preferred language"
+        if len(ranked) == 1:
+            return guess, guess, reason
+        if self._rank(streams[ranked[0]])[:2] < self._rank(streams[ranked[1]])[:2]:
+            return guess, guess, ", ".join(filter(None, [reason, "codec/channel preference"]))
+        return None, guess, "several tracks match equally"
+
+    def _rank(self, stream):
+        """Sort key of a track: preferred codec, preferred channel count, then the file's default track"""
+        codec = (stream.get('codec_name') or '').lower()
+        codec_rank = self.codecs.index(codec) if codec in self.codecs else len(self.codecs)
+        try:
+            channels = int(stream.get('channels'))
+        except (TypeError, ValueError):
+            channels = 0
+        if self.channels == "most":
+            channel_rank = -channels
+        elif self.channels == "stereo":
+            channel_rank = abs(channels - 2)
+        else:
+            channel_rank = 0
+        not_default = 0 if stream.get('disposition', {}).get('default') else 1
+        return codec_rank, channel_rank, not_default